@@ -1,18 +1,424 @@
+import collections
+import contextlib
+import functools
 import hashlib
-import io
 import json
 import logging
 import os
 import re
+import shutil
 import subprocess
-import sys
 import tempfile
+import threading
+import time
 import warnings
-import zipfile
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as futures_wait
 from pathlib import Path
 
-import requests
-from tqdm import tqdm
+from . import download
+from .bundle import ResultsBundle, write_bundle
+from .cache import CacheBackend, JSONCacheBackend, MemoryCache, SQLiteCacheBackend, WriteBehindCache
+from .metrics import label_pairs
+from .metrics import metrics as shared_metrics
+
+# asyncio is imported by the methods that use it: its import costs more than
+# the rest of this module, and it is loaded anyway once an event loop runs
+
+
+# results of the java and binaries checks, shared by all the objects of the process
+_environment_probes = dict()
+_environment_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _metric_labels(task, interactive, tier=None):
+    # built once per series, the hot path only looks them up
+    labels = {"task": task, "mode": "interactive" if interactive else "standalone"}
+    if tier is not None:
+        labels["tier"] = tier
+    return label_pairs(labels)
+
+
+def _collect_memory_cache(memory_cache, labels):
+    # the memory cache counts its own hits, they are read when metrics are scraped
+    return [
+        ("cache_hits_total", labels, memory_cache.hits),
+        ("cache_misses_total", labels, memory_cache.misses),
+    ]
+
+
+# class-data-sharing archives by path, None for those that could not be built
+_cds_archives = dict()
+_cds_lock = threading.Lock()
+# dynamic archives, made with -XX:ArchiveClassesAtExit, came with JDK 13
+CDS_MIN_JAVA_VERSION = 13
+
+
+def clear_environment_probes():
+    """Forget the java and binaries checks, the next object runs them again"""
+    with _environment_lock:
+        _environment_probes.clear()
+
+
+class InteractiveWorker:
+    """
+    A single interactive JVM process.
+
+    Lines are written to the process as soon as they are submitted, up to
+    `window` lines in flight, while a reader thread matches every output line
+    with the oldest pending request. This keeps the pipe full instead of
+    waiting for each answer before sending the next line.
+
+    Another thread drains stderr, a JVM blocks once that pipe is full. A dead
+    process is restarted on the next submit. The process is recycled once it
+    served `max_requests` lines, its resident memory exceeds `max_rss` bytes or
+    the average time it spends on a line exceeds `max_latency` seconds: a new
+    one takes the next lines while the old one answers those already sent to
+    it. The wait of a line behind the others in flight is not counted, a busy
+    process is not a slow one.
+    """
+
+    # lines between two reads of the resident memory, which costs a file read
+    RSS_CHECK_INTERVAL = 256
+    # lines answered before the average latency is trusted, the first ones pay the JVM warmup
+    LATENCY_MIN_SAMPLES = 100
+    LATENCY_SMOOTHING = 0.05
+    # seconds a recycled process has to answer its lines before it is stopped
+    RETIRE_GRACE = 30.0
+    STDERR_TAIL_LINES = 50
+
+    def __init__(
+        self,
+        command,
+        logger,
+        window=64,
+        metrics=None,
+        labels=(),
+        max_requests=None,
+        max_rss=None,
+        max_latency=None,
+    ):
+        assert window >= 1, "the in-flight window should be a positive integer"
+        self.command = command
+        self.logger = logger
+        self.metrics = metrics
+        self.labels = labels
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        self.max_latency = max_latency
+        self.proc = None
+        self.reader = None
+        self.stderr_reader = None
+        self.pending = collections.deque()
+        self.inflight = threading.Semaphore(window)
+        self.write_lock = threading.Lock()
+        self.requests = 0
+        self.answered = 0
+        self.latency = 0.0
+        self.stderr_tail = collections.deque(maxlen=self.STDERR_TAIL_LINES)
+        self.retiring = set()
+
+    def _count(self, name, value=1):
+        if self.metrics is not None:
+            self.metrics.inc(name, self.labels, value)
+
+    def start(self):
+        self._count("jvm_spawns_total")
+        proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        pending = collections.deque()
+        self.proc, self.pending = proc, pending
+        self.requests = self.answered = 0
+        self.latency = 0.0
+        self.reader = threading.Thread(target=self._read_outputs, args=(proc, pending), daemon=True)
+        self.stderr_reader = threading.Thread(target=self._drain_stderr, args=(proc,), daemon=True)
+        self.reader.start()
+        self.stderr_reader.start()
+        return proc
+
+    def _read_outputs(self, proc, pending):
+        answered_at = 0.0
+        for boutput in iter(proc.stdout.readline, b""):
+            if not pending:
+                self.logger.warning("got an output line with no pending request, ignoring it.")
+                continue
+            self._count("bytes_read_total", len(boutput))
+            future, submitted = pending.popleft()
+            self.inflight.release()
+            # the jar starts on a line once it answered the previous one, the time the line
+            # spent queued behind the others in the window is load, not a slow process
+            now = time.monotonic()
+            service_time = now - max(submitted, answered_at)
+            answered_at = now
+            if proc is self.proc:
+                self.answered += 1
+                # the first line of a process pays for the JVM start, it would skew the average
+                if self.answered > 1:
+                    self.latency += (service_time - self.latency) * self.LATENCY_SMOOTHING
+            future.set_result(boutput.decode("utf8").strip())
+        # the process has exited, nothing will answer the remaining requests
+        while pending:
+            future, _ = pending.popleft()
+            self.inflight.release()
+            future.set_exception(BrokenPipeError("the task process exited before answering"))
+
+    def _drain_stderr(self, proc):
+        # the JVM blocks on a full stderr pipe, so it is read even if nobody looks at it
+        for bline in iter(proc.stderr.readline, b""):
+            line = bline.decode("utf8", errors="replace").rstrip()
+            self.stderr_tail.append(line)
+            self.logger.debug(f"[stderr] {line}")
+
+    def _write(self, btext):
+        self.proc.stdin.write(btext)
+        self.proc.stdin.flush()
+        self._count("bytes_written_total", len(btext))
+
+    def rss(self):
+        """The resident memory of the process in bytes, None where /proc is not available."""
+        try:
+            with open(f"/proc/{self.proc.pid}/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, IndexError, OSError, ValueError):
+            return None
+
+    def oldest_wait(self):
+        """Seconds the oldest line in flight has been waiting for, 0 if there is none."""
+        try:
+            return time.monotonic() - self.pending[0][1]
+        except IndexError:
+            return 0.0
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _recycle_reason(self):
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            return f"it served {self.requests} lines"
+        if (
+            self.max_latency is not None
+            and self.answered >= self.LATENCY_MIN_SAMPLES
+            and self.latency > self.max_latency
+        ):
+            return f"it takes {self.latency * 1000:.1f}ms per line on average"
+        if self.max_rss is not None and self.requests and self.requests % self.RSS_CHECK_INTERVAL == 0:
+            rss = self.rss()
+            if rss is not None and rss > self.max_rss:
+                return f"it uses {rss // 2**20}MiB of memory"
+        return None
+
+    def _retire(self, proc, pending, threads):
+        # nothing more is written to the old process, it only has to answer what it got
+        with contextlib.suppress(OSError, ValueError):
+            proc.stdin.close()
+        try:
+            last = pending[-1][0]
+        except IndexError:
+            last = None
+        if last is not None:
+            futures_wait([last], timeout=self.RETIRE_GRACE)
+        self._stop(proc, threads)
+        self.retiring.discard(proc)
+
+    def recycle(self, reason="asked to"):
+        """Replace the process, the lines in flight are still answered by the old one."""
+        with self.write_lock:
+            self._recycle(reason)
+
+    def _recycle(self, reason):
+        self.logger.info(f"recycling the task process, {reason}..")
+        self._count("worker_recycles_total")
+        proc, pending, threads = self.proc, self.pending, (self.reader, self.stderr_reader)
+        self.retiring.add(proc)
+        self.start()
+        threading.Thread(target=self._retire, args=(proc, pending, threads), daemon=True).start()
+
+    def submit(self, btext):
+        """Send one newline terminated line and return a future of its output."""
+        self.inflight.acquire()
+        future = Future()
+        with self.write_lock:
+            if self.proc.poll() is not None:
+                self.logger.error(
+                    f"the task process exited with code {self.proc.returncode}, restarting it.. last stderr lines: {list(self.stderr_tail)[-5:]}"
+                )
+                self._count("pipe_restarts_total")
+                self.start()
+            else:
+                reason = self._recycle_reason()
+                if reason is not None:
+                    self._recycle(reason)
+            try:
+                self.pending.append((future, time.monotonic()))
+                self._write(btext)
+            except BrokenPipeError as broken_pipe:
+                self.logger.error(
+                    f"pipe broke! error code and message: [{broken_pipe}]. reinitialize the process.., This may take sometime depending on the running task"
+                )
+                # the reader of the dead process fails the old future, retry on a new one
+                self._count("pipe_restarts_total")
+                self.start()
+                self.inflight.acquire()
+                future = Future()
+                self.pending.append((future, time.monotonic()))
+                self._write(btext)
+            self.requests += 1
+        return future
+
+    def run(self, btext, timeout=None):
+        return self.submit(btext).result(timeout)
+
+    def kill(self, reason):
+        """Kill a stuck process, its lines in flight fail and the next submit starts a new one."""
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            self.logger.warning(f"killing the task process, {reason}..")
+            proc.kill()
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                proc.wait(5)
+
+    def _stop(self, proc, threads, timeout=5.0):
+        with contextlib.suppress(OSError, ValueError):
+            proc.stdin.close()
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        for thread in threads:
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def terminate(self, timeout=5.0):
+        """
+        Stop the process: close its stdin, terminate it, kill it if it does not
+        exit within `timeout` seconds and wait for the reader threads.
+        Lines still in flight fail with BrokenPipeError.
+        """
+        for proc in list(self.retiring):
+            self._stop(proc, (), timeout)
+        if self.proc is not None:
+            self._stop(self.proc, (self.reader, self.stderr_reader), timeout)
+
+
+class AsyncInteractiveWorker:
+    """The asyncio counterpart of `InteractiveWorker`, driven by the event loop."""
+
+    def __init__(self, command, logger, window=64, metrics=None, labels=()):
+        import asyncio
+        assert window >= 1, "the in-flight window should be a positive integer"
+        self.command = command
+        self.logger = logger
+        self.metrics = metrics
+        self.labels = labels
+        self.proc = None
+        self.reader = None
+        self.pending = collections.deque()
+        self.inflight = asyncio.Semaphore(window)
+
+    _count = InteractiveWorker._count
+
+    async def start(self):
+        import asyncio
+        self._count("jvm_spawns_total")
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self.pending = collections.deque()
+        self.reader = asyncio.ensure_future(self._read_outputs(self.proc, self.pending))
+        return self.proc
+
+    async def _read_outputs(self, proc, pending):
+        import asyncio
+        while True:
+            try:
+                boutput = await proc.stdout.readline()
+            except asyncio.CancelledError:
+                # the loop is shutting down, as at the end of asyncio.run: the process goes
+                # with it, while the loop can still close its pipes
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+            if not boutput:
+                break
+            if not pending:
+                self.logger.warning("got an output line with no pending request, ignoring it.")
+                continue
+            self._count("bytes_read_total", len(boutput))
+            future, _ = pending.popleft()
+            self.inflight.release()
+            # a cancelled caller leaves its future behind, its line is consumed anyway
+            if not future.done():
+                future.set_result(boutput.decode("utf8").strip())
+        while pending:
+            future, _ = pending.popleft()
+            self.inflight.release()
+            if not future.done():
+                future.set_exception(BrokenPipeError("the task process exited before answering"))
+
+    async def submit(self, btext):
+        """Send one newline terminated line and return a future of its output."""
+        import asyncio
+        await self.inflight.acquire()
+        if self.proc.returncode is not None:
+            self.logger.error(f"the task process exited with code {self.proc.returncode}, restarting it..")
+            self._count("pipe_restarts_total")
+            await self.start()
+        proc = self.proc
+        future = asyncio.get_running_loop().create_future()
+        # appending and writing happen without yielding, so the order is kept
+        self.pending.append((future, time.monotonic()))
+        proc.stdin.write(btext)
+        self._count("bytes_written_total", len(btext))
+        try:
+            # waits here while the pipe is full, this is the backpressure point
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as broken_pipe:
+            if self.proc is proc:
+                self.logger.error(
+                    f"pipe broke! error code and message: [{broken_pipe}]. reinitialize the process.., This may take sometime depending on the running task"
+                )
+                self._count("pipe_restarts_total")
+                await self.start()
+            return await self.submit(btext)
+        return future
+
+    async def run(self, btext):
+        return await (await self.submit(btext))
+
+    oldest_wait = InteractiveWorker.oldest_wait
+
+    def kill(self, reason=None):
+        if self.proc is not None and self.proc.returncode is None:
+            if reason is not None:
+                self.logger.warning(f"killing the task process, {reason}..")
+            try:
+                self.proc.kill()
+            except (ProcessLookupError, RuntimeError):
+                # already gone, or its event loop is closed
+                pass
+
+    async def terminate(self):
+        import asyncio
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.stdin.close()
+            self.proc.terminate()
+            await self.proc.wait()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
 
 
 class FarasaBase:
@@ -25,14 +431,77 @@ class FarasaBase:
     # shlex not compatible with Windows replace it with list()
     # set java encoding with option `-Dfile.encoding=UTF-8`
     BASE_CMD = ["java", "-Dfile.encoding=UTF-8", "-jar"]
+    # the command that prints the java version, it is checked once per java binary
+    JAVA_VERSION_CMD = ["java", "-version"]
+    # options of every JVM of the task, put before `-jar`, such as ["-Xmx2g"]
+    JVM_OPTIONS = ()
     interactive = False
-    task_proc = None
     logger = None
     is_downloadable = True
+    # tasks whose output for a word does not depend on its neighbours
+    word_level = False
+    # whether long lines may be cut at sentence ends when chunking standalone runs
+    sentence_chunking = True
+    SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?؟])\s+")
 
-    def __init__(self, interactive=False, logging_level="WARNING", binary_path=None, cache=True, cache_dir=None):
+    def __init__(
+        self,
+        interactive=False,
+        logging_level="WARNING",
+        binary_path=None,
+        cache=True,
+        cache_dir=None,
+        workers=1,
+        inflight_window=64,
+        cache_backend="json",
+        cache_write_behind=True,
+        memory_cache_entries=1024,
+        memory_cache_bytes=None,
+        cache_granularity="text",
+        type_level=False,
+        type_vocabulary_entries=1_000_000,
+        standalone_jobs=1,
+        min_chunk_chars=10000,
+        lazy=False,
+        environment_stamp=False,
+        metrics=None,
+        timeout=None,
+        max_worker_requests=None,
+        max_worker_rss=None,
+        max_worker_latency=None,
+        jvm_options=None,
+        class_data_sharing=False,
+        bundle=None,
+    ):
         self.config_logs(logging_level)
+        # the shared registry by default, False turns the metrics off
+        self.metrics = shared_metrics if metrics is None else metrics or None
         self.cache_enabled = cache
+        assert cache_granularity in ("text", "line"), "cache_granularity should be 'text' or 'line'"
+        self.cache_granularity = cache_granularity
+        assert not type_level or self.word_level, f"type level mode is not supported for the [{self.task}] task"
+        self.type_level = type_level
+        # an LRU, so that the distinct words of an endless stream do not exhaust the memory
+        self.type_vocabulary = MemoryCache(max_entries=type_vocabulary_entries)
+        assert workers >= 1, "workers should be a positive integer"
+        self.workers = workers
+        self.inflight_window = inflight_window
+        assert standalone_jobs >= 1, "standalone_jobs should be a positive integer"
+        self.standalone_jobs = standalone_jobs
+        self.min_chunk_chars = min_chunk_chars
+        assert timeout is None or timeout > 0, "timeout should be a positive number of seconds"
+        self.timeout = timeout
+        self.max_worker_requests = max_worker_requests
+        self.max_worker_rss = max_worker_rss
+        self.max_worker_latency = max_worker_latency
+        self.jvm_options = [*self.JVM_OPTIONS, *(jvm_options or ())]
+        self.class_data_sharing = class_data_sharing
+        self.task_workers = []
+        self._workers_lock = threading.Lock()
+        # event loop: (asyncio lock, async workers)
+        self._async_pools = dict()
+        self._async_pools_lock = threading.Lock()
+        self._start_lock = threading.Lock()
         
         # Set cache directory: user-provided, or OS-appropriate default
         if cache_dir is not None:
@@ -44,11 +513,34 @@ class FarasaBase:
             else:  # Unix-like (Linux, macOS, etc.)
                 cache_base = Path(os.getenv('XDG_CACHE_HOME', Path.home() / '.cache'))
             self.cache_dir = cache_base / "farasapy"
+        self.environment_stamp = self.cache_dir / "environment.json" if environment_stamp else None
+        self.cache_backend = None
+        self.memory_cache = None
+        self._cache_counts = collections.Counter()
+        self._inflight = dict()
+        self._inflight_lock = threading.Lock()
+        self._ainflight = dict()
+        self.bundle = None
+        if bundle is not None:
+            self.open_bundle(bundle)
         if self.cache_enabled:
-            self._setup_cache()
+            self._setup_cache(cache_backend, cache_write_behind)
+            if memory_cache_entries or memory_cache_bytes:
+                self.memory_cache = MemoryCache(memory_cache_entries or None, memory_cache_bytes)
+                if self.metrics is not None:
+                    labels = _metric_labels(self.task, interactive, "memory")
+                    collector = functools.partial(_collect_memory_cache, self.memory_cache, labels)
+                    self.metrics.add_collector(collector)
+                    # once this object is gone, its counts are added to the totals of the registry
+                    weakref.finalize(self, self.metrics.remove_collector, collector)
         self.logger.debug("perform system check...")
         self.logger.debug("check java version...")
-        self.check_java_version()
+        self.java_version = self.check_java_version()
+        if self.class_data_sharing and self.java_version is not None and self.java_version < CDS_MIN_JAVA_VERSION:
+            self.logger.warning(
+                f"class data sharing needs java {CDS_MIN_JAVA_VERSION}+, found {self.java_version}. launching without it."
+            )
+            self.class_data_sharing = False
         self.logger.debug("check toolkit binaries...")
         if binary_path is not None:
             self.bin_path = Path(binary_path)
@@ -70,18 +562,37 @@ class FarasaBase:
             self.logger.warning(
                 "Be careful with large lines as they may break on interactive mode. You may switch to Standalone mode for such cases."
             )
-            self.logger.info(
-                f"\033[37minitializing [{self.task.upper()}] task in \033[32mINTERACTIVE \033[37mmode..."
-            )
-            self.initialize_task()
-            self.logger.info(
-                f"task [{self.task.upper()}] is initialized interactively."
-            )
+            if lazy:
+                self.logger.info(
+                    f"task [{self.task.upper()}] will start in \033[32mINTERACTIVE \033[37mmode on first use..."
+                )
+            else:
+                self.warm()
         else:
             self.logger.info(
                 f"task [{self.task.upper()}] is initialized in \033[34mSTANDALONE \033[37mmode..."
             )
 
+    @property
+    def task_proc(self):
+        """The process of the first interactive worker, if any."""
+        if not self.task_workers:
+            return None
+        return self.task_workers[0].proc
+
+    @property
+    def metric_labels(self):
+        return _metric_labels(self.task, self.interactive)
+
+    def _count(self, name, value=1, tier=None):
+        if self.metrics is not None:
+            self.metrics.inc(name, _metric_labels(self.task, self.interactive, tier), value)
+
+    def _span(self, name):
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.span(name, self.metric_labels)
+
     @property
     def command(self):
         """
@@ -89,6 +600,75 @@ class FarasaBase:
         """
         raise NotImplemented
 
+    @property
+    def launch_command(self):
+        """
+        `command` with the JVM options and, with `class_data_sharing`, the
+        class-data-sharing archive of the jar put before `-jar`.
+        """
+        command = self.command
+        if "-jar" not in command:
+            # not a JVM launch, such as the fake jar of the benchmarks
+            return command
+        position = command.index("-jar")
+        options = list(self.jvm_options)
+        if self.class_data_sharing:
+            archive = self.cds_archive(command, position, options)
+            if archive is not None:
+                options.append(f"-XX:SharedArchiveFile={archive}")
+        return command[:position] + options + command[position:]
+
+    def cds_archive(self, command, position, options):
+        """
+        The class-data-sharing archive of the jar of `command`, built on first use.
+
+        The archive holds the classes the jar loads, already parsed and
+        verified, so the JVMs started later map them instead of loading them.
+        It is kept in `<cache_dir>/cds`, named after the jar, the java binary
+        and the JVM options it was built with, and built once per machine.
+        """
+        jar = Path(command[position + 1])
+        jar_stat = jar.stat()
+        key = f"{jar.resolve()}:{jar_stat.st_size}:{jar_stat.st_mtime_ns}:{self._java_fingerprint()}:{options}"
+        archive = self.cache_dir / "cds" / f"{jar.stem}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.jsa"
+        with _cds_lock:
+            if archive not in _cds_archives:
+                if not archive.is_file():
+                    self._build_cds_archive(command, position, options, archive)
+                _cds_archives[archive] = archive if archive.is_file() else None
+            return _cds_archives[archive]
+
+    def _build_cds_archive(self, command, position, options, archive):
+        # a standalone run on the startup probe word, the JVM dumps the classes it loaded when it exits
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        staging = archive.with_name(f"{archive.name}.{os.getpid()}.tmp")
+        self.logger.info(f"building the class-data-sharing archive of {command[position + 1]}..")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path, output_path = Path(tmpdir) / "input.txt", Path(tmpdir) / "output.txt"
+            input_path.write_text("اختبار\n", encoding="utf-8")
+            started = time.perf_counter()
+            try:
+                proc = subprocess.run(
+                    command[:position]
+                    + options
+                    + [f"-XX:ArchiveClassesAtExit={staging}"]
+                    + command[position:]
+                    + ["-i", str(input_path), "-o", str(output_path)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    timeout=self.timeout,
+                )
+            except subprocess.TimeoutExpired:
+                proc = None
+        if proc is not None and proc.returncode == 0 and staging.is_file():
+            # several processes may build the same archive, the last rename wins
+            os.replace(staging, archive)
+            self.logger.info(f"built {archive} in {time.perf_counter() - started:.1f}s")
+            return
+        staging.unlink(missing_ok=True)
+        error = "timed out" if proc is None else proc.stderr.decode("utf8", errors="replace").strip()[-500:]
+        self.logger.warning(f"could not build the class-data-sharing archive, launching without it: {error}")
+
     def config_logs(self, logging_level):
         self.logger = logging.getLogger("farasapy_logger")
         self.logger.propagate = False
@@ -101,31 +681,81 @@ class FarasaBase:
             stream_logger.setFormatter(logs_formatter)
             self.logger.addHandler(stream_logger)
 
-    def check_java_version(self):
+    def _probe_java_version(self):
         try:
             version_proc_output = subprocess.check_output(
-                ["java", "-version"], stderr=subprocess.STDOUT, encoding="utf8"
+                self.JAVA_VERSION_CMD, stderr=subprocess.STDOUT, encoding="utf8"
             )
             # version_pattern = r"\"(\d+\.\d+).*\""
             version_pattern = r"\"(\d+(\.\d+){0,1})"
-            java_version = float(
+            return float(
                 re.search(version_pattern, version_proc_output).groups()[0]
             )
-            if java_version >= 1.7:
-                self.logger.debug(
-                    f"Your java version is {java_version} which is compatible with Farasa "
-                )
-            else:
-                warnings.warn(
-                    "You are using old version of java. Farasa is compatible with Java 7 and above "
-                )
         except subprocess.CalledProcessError as proc_err:
             self.logger.error(f"error occurred: {proc_err}.")
             raise Exception(
                 "We could not check for java version on the machine. Please make sure you have installed Java 1.7+ and add it to your PATH."
             )
 
+    def _java_fingerprint(self):
+        java_path = shutil.which(self.JAVA_VERSION_CMD[0])
+        if java_path is None:
+            return None
+        real_path = os.path.realpath(java_path)
+        return f"{real_path}:{os.stat(real_path).st_mtime_ns}"
+
+    def _read_environment_stamp(self, fingerprint):
+        if self.environment_stamp is None or not self.environment_stamp.is_file():
+            return None
+        try:
+            with open(self.environment_stamp, "r", encoding="utf-8") as f:
+                stamp = json.load(f)
+            if stamp.get("java") == fingerprint:
+                return stamp["java_version"]
+        except Exception as e:
+            self.logger.debug(f"ignoring the environment stamp: {e}")
+        return None
+
+    def _write_environment_stamp(self, fingerprint, java_version):
+        if self.environment_stamp is None or fingerprint is None:
+            return
+        try:
+            self.environment_stamp.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.environment_stamp, "w", encoding="utf-8") as f:
+                json.dump({"java": fingerprint, "java_version": java_version}, f)
+        except Exception as e:
+            self.logger.debug(f"could not write the environment stamp: {e}")
+
+    def check_java_version(self):
+        """
+        Check the java on PATH, running `java -version` once per process.
+
+        The result is remembered for the java binary it was measured on and,
+        with `environment_stamp`, saved to a file so that later processes do
+        not fork java either.
+        """
+        fingerprint = self._java_fingerprint()
+        with _environment_lock:
+            java_version = _environment_probes.get(fingerprint)
+            if java_version is None:
+                java_version = self._read_environment_stamp(fingerprint)
+            if java_version is None:
+                java_version = self._probe_java_version()
+                self._write_environment_stamp(fingerprint, java_version)
+            _environment_probes[fingerprint] = java_version
+        if java_version >= 1.7:
+            self.logger.debug(
+                f"Your java version is {java_version} which is compatible with Farasa "
+            )
+        else:
+            warnings.warn(
+                "You are using old version of java. Farasa is compatible with Java 7 and above "
+            )
+        return java_version
+
     def check_toolkit_binaries(self):
+        if _environment_probes.get("binaries") == str(self.bin_dir):
+            return
         download = False
         # check in bin folder:
         for jar in ("FarasaNERJar", "FarasaPOSJar", "FarasaDiacritizeJar"):
@@ -138,60 +768,132 @@ class FarasaBase:
         ):  # last check for binaries in farasa_bin/lib
             self.logger.info("some binaries does not exist. Downloading...")
             self.download_binaries()
-
-    def get_content_with_progressbar(self, request):
-        totalsize = int(request.headers.get("content-length", 0))
-        blocksize = 3413334
-        bar = tqdm(
-            total=totalsize,
-            unit="iB",
-            unit_scale=True,
-            ncols=5,
-            dynamic_ncols=True,
-            file=sys.stdout,
-        )
-        content = None
-        for data in request.iter_content(blocksize):
-            bar.update(len(data))
-            if content is None:
-                content = data
-            else:
-                content += data
-        return content
+        else:
+            _environment_probes["binaries"] = str(self.bin_dir)
 
     def download_binaries(self):
-        self.logger.info("downloading zipped binaries...")
         try:
-            # change download url from github releases to qcri
-            # binaries_url = "https://github.com/MagedSaeed/farasapy/releases/download/toolkit-bins-released/farasa_bin.zip"
-            binaries_url = "https://farasa-api.qcri.org/farasapy/releases/download/toolkit-bins-released/farasa_bin.zip"
-            binaries_request = requests.get(binaries_url, stream=True, verify=False)
-            # show the progress bar while getting content
-            content_bytes = self.get_content_with_progressbar(binaries_request)
-            self.logger.debug("extracting...")
-            binzip = zipfile.ZipFile(io.BytesIO(content_bytes))
-            binzip.extractall(path=self.base_dir)
-            self.logger.debug("toolkit binaries are downloaded and extracted.")
+            download.download_binaries(self.base_dir)
         except Exception as e:
-            self.logger.error("an error occurred")
+            self.logger.error("an error occurred while getting the toolkit binaries")
             self.logger.error(e)
+            raise
 
     def initialize_task_proc(self):
-        self.task_proc = subprocess.Popen(
-            self.command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        worker = InteractiveWorker(
+            self.launch_command,
+            self.logger,
+            window=self.inflight_window,
+            metrics=self.metrics,
+            labels=self.metric_labels,
+            max_requests=self.max_worker_requests,
+            max_rss=self.max_worker_rss,
+            max_latency=self.max_worker_latency,
         )
+        worker.start()
+        return worker
 
     def initialize_task(self):
         word = "اختبار"
         word += "\n"
         bword = str.encode(word)
-        self.initialize_task_proc()
-        return self.run_task_interactive(bword)
+        self.task_workers = [self.initialize_task_proc() for _ in range(self.workers)]
+        outputs = [worker.run(bword) for worker in self.task_workers]
+        return outputs[0]
+
+    def warm(self, background=False):
+        """
+        Start the interactive workers if they are not running yet.
+
+        With `background=True` they are started in a daemon thread, which is
+        returned, so that construction does not wait for the JVMs.
+        """
+        assert self.interactive, "only interactive tasks can be warmed up"
+        if background:
+            thread = threading.Thread(target=self.warm, daemon=True)
+            thread.start()
+            return thread
+        with self._start_lock:
+            if not self.task_workers:
+                self.logger.info(
+                    f"\033[37minitializing [{self.task.upper()}] task in \033[32mINTERACTIVE \033[37mmode with {self.workers} worker(s)..."
+                )
+                self.initialize_task()
+                self.logger.info(
+                    f"task [{self.task.upper()}] is initialized interactively."
+                )
+
+    def checkout_worker(self):
+        """Pick the interactive worker with the fewest lines in flight."""
+        if not self.task_workers:
+            self.warm()
+        with self._workers_lock:
+            return min(self.task_workers, key=lambda worker: len(worker.pending))
+
+    def health_check(self):
+        """
+        Restart the interactive workers whose process died and report on each
+        of them: its pid, whether it was alive, the lines it served and has in
+        flight, its average time per line in seconds and its resident memory.
+        """
+        report = list()
+        with self._workers_lock:
+            workers = list(self.task_workers)
+        for worker in workers:
+            alive = worker.is_alive()
+            report.append(
+                {
+                    "pid": worker.proc.pid,
+                    "alive": alive,
+                    "requests": worker.requests,
+                    "pending": len(worker.pending),
+                    "latency": worker.latency,
+                    "rss": worker.rss() if alive else None,
+                }
+            )
+            if not alive:
+                with worker.write_lock:
+                    if not worker.is_alive():
+                        self.logger.error(f"the task process exited with code {worker.proc.returncode}, restarting it..")
+                        self._count("pipe_restarts_total")
+                        worker.start()
+        return report
+
+    def _stalled(self, workers):
+        # a line waiting longer than the timeout means its process is stuck
+        return [worker for worker in workers if worker.oldest_wait() >= self.timeout]
+
+    def _timed_out(self, stalled):
+        # the lines in flight on a stuck process are lost, it is killed and started again on the next line
+        self._count("timeouts_total")
+        for worker in stalled:
+            worker.kill(f"a line got no answer within {self.timeout} seconds")
+        return TimeoutError(f"the [{self.task}] task did not answer within {self.timeout} seconds")
+
+    def run_task_file(self, input_path, output_path):
+        """Run the jar straight on `input_path`, writing its output to `output_path`"""
+        self._count("jvm_spawns_total")
+        try:
+            proc = subprocess.run(
+                self.launch_command + ["-i", str(input_path), "-o", str(output_path)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.timeout,
+                # this only compatiple with python>3.6
+                # capture_output=True,
+            )
+        except subprocess.TimeoutExpired:
+            # subprocess.run has killed the process already
+            self._count("timeouts_total")
+            raise TimeoutError(f"the [{self.task}] task did not finish within {self.timeout} seconds") from None
+        if proc.returncode != 0:
+            self.logger.critical(
+                f"error occurred! stdout: , {proc.stdout},  stderr: , {proc.stderr}"
+            )
+            self.logger.critical(f"return code: {proc.returncode}")
+            raise Exception("Internal Error occurred!")
 
-    def run_task_standalone(self, btext):
+    def run_task_standalone(self, btext, strip=True):
         assert btext is not None
         tmpdir = str(self.base_dir / "tmp")
         # if delete=True on Windows cannot get any content
@@ -202,21 +904,14 @@ class FarasaBase:
             itmp.write(btext)
             # https://stackoverflow.com/questions/46004774/python-namedtemporaryfile-appears-empty-even-after-data-is-written
             itmp.flush()
-            proc = subprocess.run(
-                self.command + ["-i", itmp.name, "-o", otmp.name],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                # this only compatiple with python>3.6
-                # capture_output=True,
-            )
-            if proc.returncode == 0:
-                result = otmp.read().decode("utf8").strip()
-            else:
-                self.logger.critical(
-                    f"error occurred! stdout: , {proc.stdout},  stderr: , {proc.stderr}"
-                )
-                self.logger.critical(f"return code: {proc.returncode}")
-                raise Exception("Internal Error occurred!")
+            with self._span("run_task_standalone"):
+                self.run_task_file(itmp.name, otmp.name)
+            boutput = otmp.read()
+            self._count("bytes_written_total", len(btext))
+            self._count("bytes_read_total", len(boutput))
+            result = boutput.decode("utf8")
+            if strip:
+                result = result.strip()
         finally:
             itmp.close()
             otmp.close()
@@ -224,50 +919,380 @@ class FarasaBase:
             os.unlink(otmp.name)
         return result
 
-    def run_task_interactive(self, btext):
+    def submit_task_interactive(self, btext):
         assert isinstance(btext, bytes)
         assert self.interactive
-        try:
-            self.task_proc.stdin.flush()
-            self.task_proc.stdin.write(btext)
-            self.task_proc.stdin.flush()
-        except BrokenPipeError as broken_pipe:
-            self.logger.error(
-                f"pipe broke! error code and message: [{broken_pipe}]. reinitialize the process.., This may take sometime depending on the running task"
-            )
-            self.initialize_task_proc()
-            self.task_proc.stdin.flush()
-            self.task_proc.stdin.write(btext)
-            self.task_proc.stdin.flush()
+        return self.checkout_worker().submit(btext)
 
-        output = self.task_proc.stdout.readline().decode("utf8").strip()
-        self.task_proc.stdout.flush()
-        return output
+    def run_task_interactive(self, btext):
+        with self._span("run_task_interactive"):
+            future = self.submit_task_interactive(btext)
+            try:
+                return future.result(self.timeout)
+            except FutureTimeoutError:
+                raise self._timed_out(self._stalled(self.task_workers)) from None
+
+    def submit_lines_interactive(self, strip_text):
+        return [
+            self.submit_task_interactive(str.encode(line + "\n"))
+            for line in strip_text.split("\n")
+        ]
+
+    def gather_lines_interactive(self, futures):
+        if self.timeout is None:
+            outputs = [future.result() for future in futures]
+        else:
+            # the timeout bounds the whole text, not each of its lines
+            deadline = time.monotonic() + self.timeout
+            try:
+                outputs = [future.result(max(0.0, deadline - time.monotonic())) for future in futures]
+            except FutureTimeoutError:
+                raise self._timed_out(self._stalled(self.task_workers)) from None
+        return "\n".join(output for output in outputs if output)
 
     def do_task_interactive(self, strip_text):
-        outputs = []
+        # lines are streamed into the workers and their outputs collected in order
+        with self._span("run_task_interactive"):
+            return self.gather_lines_interactive(self.submit_lines_interactive(strip_text))
+
+    def _split_chunks(self, strip_text):
+        """
+        Cut a text into at most `standalone_jobs` chunks of similar sizes.
+
+        Chunks end at line ends or, for tasks with `sentence_chunking`, at
+        sentence ends. Returns the chunks and the separators to put back
+        between their outputs.
+        """
+        count = min(self.standalone_jobs, len(strip_text) // max(self.min_chunk_chars, 1))
+        if count < 2:
+            return [strip_text], []
+        units = list()
         for line in strip_text.split("\n"):
-            newlined_line = line + "\n"
-            byted_newlined_line = str.encode(newlined_line)
-            output = self.run_task_interactive(byted_newlined_line)
-            if output:
-                outputs.append(output)
-        return "\n".join(outputs)
+            sentences = self.SENTENCE_BOUNDARY.split(line) if self.sentence_chunking else [line]
+            units.append(("\n", sentences[0]))
+            units.extend((" ", sentence) for sentence in sentences[1:])
+        target_size = len(strip_text) / count
+        chunks, joiners, current, size = list(), list(), list(), 0
+        for joiner, unit in units:
+            if current and size >= target_size and len(chunks) < count - 1:
+                chunks.append(current)
+                joiners.append(joiner)
+                current, size = list(), 0
+            current.append((joiner, unit))
+            size += len(unit) + 1
+        chunks.append(current)
+        texts = [chunk[0][1] + "".join(joiner + unit for joiner, unit in chunk[1:]) for chunk in chunks]
+        return texts, joiners
+
+    def _stitch_chunks(self, outputs, joiners):
+        stitched = list()
+        for output in outputs:
+            if output.endswith("\n"):
+                output = output[:-1]
+            stitched.append(output.rstrip("\r"))
+        result = stitched[0]
+        for joiner, output in zip(joiners, stitched[1:]):
+            result += joiner + output
+        return result.strip()
+
+    def _group_documents(self, strip_texts):
+        """Spread the texts of a batch over at most `standalone_jobs` groups"""
+        total_size = sum(len(strip_text) for strip_text in strip_texts)
+        count = min(self.standalone_jobs, len(strip_texts), total_size // max(self.min_chunk_chars, 1))
+        if count < 2:
+            return [strip_texts]
+        target_size = total_size / count
+        groups, current, size = list(), list(), 0
+        for strip_text in strip_texts:
+            if current and size >= target_size and len(groups) < count - 1:
+                groups.append(current)
+                current, size = list(), 0
+            current.append(strip_text)
+            size += len(strip_text)
+        groups.append(current)
+        return groups
 
     def do_task_standalone(self, strip_text):
-        byted_strip_text = str.encode(strip_text)
-        return self.run_task_standalone(btext=byted_strip_text)
+        chunks, joiners = self._split_chunks(strip_text)
+        if len(chunks) == 1:
+            byted_strip_text = str.encode(strip_text)
+            return self.run_task_standalone(btext=byted_strip_text)
+        # every chunk gets its own JVM, the outputs are stitched in order
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            outputs = list(
+                executor.map(
+                    lambda chunk: self.run_task_standalone(btext=str.encode(chunk), strip=False),
+                    chunks,
+                )
+            )
+        return self._stitch_chunks(outputs, joiners)
+
+    def _pack_documents(self, strip_texts):
+        documents = [strip_text.split("\n") for strip_text in strip_texts]
+        btext = str.encode("\n".join(line for lines in documents for line in lines) + "\n")
+        return btext, documents
+
+    def _unpack_documents(self, output, documents):
+        if output.endswith("\n"):
+            output = output[:-1]
+        output_lines = [line.rstrip("\r") for line in output.split("\n")]
+        lines_count = sum(len(lines) for lines in documents)
+        if len(output_lines) != lines_count:
+            self.logger.warning(
+                f"batch output has {len(output_lines)} lines for {lines_count} input lines. Processing the {len(documents)} texts one by one.."
+            )
+            return None
+        results, start = list(), 0
+        for lines in documents:
+            end = start + len(lines)
+            results.append("\n".join(output_lines[start:end]).strip())
+            start = end
+        return results
+
+    def _run_batch_standalone(self, strip_texts):
+        btext, documents = self._pack_documents(strip_texts)
+        output = self.run_task_standalone(btext=btext, strip=False)
+        results = self._unpack_documents(output, documents)
+        if results is None:
+            return [self.do_task_standalone(strip_text) for strip_text in strip_texts]
+        return results
+
+    def do_batch_standalone(self, strip_texts):
+        """
+        Run many texts through a single standalone JVM.
+
+        The texts are written one after the other into the same input file and
+        the output is cut back into documents by their line counts. If the jar
+        does not answer with exactly one line per input line, the boundaries
+        cannot be trusted and every text is processed on its own instead.
+        Large batches are split over `standalone_jobs` concurrent JVMs.
+        """
+        groups = self._group_documents(strip_texts)
+        if len(groups) == 1:
+            return self._run_batch_standalone(strip_texts)
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            outputs = executor.map(self._run_batch_standalone, groups)
+        return [result for results in outputs for result in results]
+
+    def _lookup_many(self, texts):
+        strip_texts = [text.strip() for text in texts]
+        results = [self._load_from_memory(strip_text) for strip_text in strip_texts]
+        # identical texts are processed once and share the same result
+        missed = dict()
+        for index, strip_text in enumerate(strip_texts):
+            if results[index] is None:
+                missed.setdefault(strip_text, list()).append(index)
+        if not missed:
+            return results, missed
+
+        cache_keys = {strip_text: self._get_cache_key(strip_text) for strip_text in missed}
+        cached_results = self._load_many_from_cache(list(cache_keys.values()))
+        for strip_text, cache_key in cache_keys.items():
+            cached_result = cached_results.get(cache_key)
+            if cached_result is not None:
+                self._save_to_memory(strip_text, cached_result)
+                for index in missed.pop(strip_text):
+                    results[index] = cached_result
+        return results, missed
+
+    def _store_many(self, results, missed, outputs):
+        for strip_text, output in zip(missed, outputs):
+            self._save_to_memory(strip_text, output)
+            for index in missed[strip_text]:
+                results[index] = output
+        if self.cache_enabled:
+            try:
+                self.cache_backend.set_many(
+                    (self._get_cache_key(strip_text), strip_text, output)
+                    for strip_text, output in zip(missed, outputs)
+                )
+            except Exception as e:
+                self.logger.warning(f"Failed to save to cache: {e}")
+        return results
+
+    def _run_many(self, strip_texts):
+        if self.interactive:
+            with self._span("run_task_interactive"):
+                submitted = [self.submit_lines_interactive(strip_text) for strip_text in strip_texts]
+                return [self.gather_lines_interactive(futures) for futures in submitted]
+        return self.do_batch_standalone(strip_texts)
+
+    def _do_task_many_by_text(self, texts):
+        results, missed = self._lookup_many(texts)
+        if not missed:
+            return results
+        return self._store_many(results, missed, self._run_many(list(missed)))
+
+    def _split_documents(self, texts):
+        return [text.strip().split("\n") for text in texts]
+
+    def _join_documents(self, documents, line_results):
+        results, start = list(), 0
+        for lines in documents:
+            end = start + len(lines)
+            outputs = line_results[start:end]
+            if self.interactive:
+                results.append("\n".join(output for output in outputs if output))
+            else:
+                results.append("\n".join(outputs).strip())
+            start = end
+        return results
+
+    def _do_task_many_by_line(self, texts):
+        # every line is looked up on its own and only the missing ones reach the JVM
+        documents = self._split_documents(texts)
+        line_results = self._do_task_many_by_text(line for lines in documents for line in lines)
+        return self._join_documents(documents, line_results)
+
+    def _split_types(self, texts):
+        """
+        Split `texts` into words and look every distinct word up in the vocabulary.
+
+        Returns the documents, the results found and the words to process. The
+        results of a batch are kept apart from the vocabulary, which may evict
+        some of them before the texts are joined.
+        """
+        documents = [[line.split() for line in text.strip().split("\n")] for text in texts]
+        found = dict()
+        unseen = list()
+        for word in {word for lines in documents for words in lines for word in words}:
+            result = self.type_vocabulary.get(word)
+            if result is None:
+                unseen.append(word)
+            else:
+                found[word] = result
+        return documents, found, unseen
+
+    def _learn_types(self, found, unseen, results):
+        for word, result in zip(unseen, results):
+            found[word] = result
+            self.type_vocabulary.set(word, result)
+
+    def _join_types(self, documents, found):
+        results = list()
+        for lines in documents:
+            # a word with an empty result keeps its place
+            outputs = [" ".join(found[word] for word in words) for words in lines]
+            if self.interactive:
+                results.append("\n".join(output for output in outputs if output))
+            else:
+                results.append("\n".join(outputs).strip())
+        return results
+
+    def _do_task_many_by_type(self, texts):
+        """
+        Process every distinct word once and rebuild the texts by lookup.
+
+        Words never seen by this object go through the cache and then to the
+        JVM in a single batch. Their results are kept in `type_vocabulary`,
+        the `type_vocabulary_entries` most recently used of them.
+        """
+        documents, found, unseen = self._split_types(texts)
+        if unseen:
+            self._learn_types(found, unseen, self._do_task_many_by_text(unseen))
+        return self._join_types(documents, found)
+
+    def save_vocabulary(self, path):
+        """Write the word to result dictionary of the type level mode as JSON"""
+        with self.type_vocabulary.lock:
+            vocabulary = dict(self.type_vocabulary.entries)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+
+    def load_vocabulary(self, path):
+        """Merge a dictionary written by `save_vocabulary` into this object"""
+        with open(path, "r", encoding="utf-8") as f:
+            for word, result in json.load(f).items():
+                self.type_vocabulary.set(word, result)
+
+    def do_task_many(self, texts):
+        """Process many texts, using the cache per text and one JVM call for all the misses."""
+        with self._span("do_task_many"):
+            if self.type_level:
+                return self._do_task_many_by_type(texts)
+            if self.cache_granularity == "line":
+                return self._do_task_many_by_line(texts)
+            return self._do_task_many_by_text(texts)
+
+    def iter_task(self, lines, batch_size=1000):
+        """
+        Yield one result per item of `lines`, in order.
+
+        Items are read and processed `batch_size` at a time, so memory use does
+        not grow with the length of the iterable. A trailing newline of an
+        item is ignored, which makes open files valid inputs.
+        """
+        batch = list()
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield from self.do_task_many(batch)
+                batch = list()
+        if batch:
+            yield from self.do_task_many(batch)
+
+    def do_task_file(self, input_path, output_path, batch_size=1000):
+        """
+        Process the file at `input_path` into `output_path` line by line.
+
+        In standalone mode the paths are handed to the jar as they are. In
+        interactive mode the lines are streamed through the workers with at
+        most `batch_size` of them in memory, one output line per input line.
+        """
+        if not self.interactive:
+            return self.run_task_file(input_path, output_path)
+        with open(input_path, "r", encoding="utf-8") as input_file, open(
+            output_path, "w", encoding="utf-8"
+        ) as output_file:
+            for result in self.iter_task(input_file, batch_size=batch_size):
+                output_file.write(result + "\n")
 
     def do_task(self, text):
         strip_text = text.strip()
-        
-        # Store current text for cache saving
-        self._current_text = strip_text
-        
+
+        # Recently used results are served from memory without hashing the text
+        cached_result = self._load_from_memory(strip_text)
+        if cached_result is not None:
+            return cached_result
+
+        # memory hits are only counted, timing them would cost more than serving them
+        with self._span("do_task"):
+            return self._do_task_single_flight(strip_text)
+
+    def _do_task_single_flight(self, strip_text):
+        # Concurrent calls for the same text wait for the first one to finish
+        with self._inflight_lock:
+            inflight = self._inflight.get(strip_text)
+            if inflight is None:
+                self._inflight[strip_text] = Future()
+            else:
+                self._cache_counts["coalesced"] += 1
+        if inflight is not None:
+            return inflight.result()
+
+        future = self._inflight[strip_text]
+        try:
+            result = self._do_task_uncached(strip_text)
+            future.set_result(result)
+            return result
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[strip_text]
+
+    def _do_task_uncached(self, strip_text):
+        if self.type_level:
+            return self._do_task_many_by_type([strip_text])[0]
+        if self.cache_granularity == "line":
+            return self._do_task_many_by_line([strip_text])[0]
+
         # Try to load from cache first
         cache_key = self._get_cache_key(strip_text)
         cached_result = self._load_from_cache(cache_key)
         if cached_result is not None:
+            self._save_to_memory(strip_text, cached_result)
             return cached_result
         
         # Execute the task if not in cache
@@ -277,11 +1302,286 @@ class FarasaBase:
             result = self.do_task_standalone(strip_text)
         
         # Save result to cache
-        self._save_to_cache(cache_key, result)
+        self._save_to_memory(strip_text, result)
+        self._save_to_cache(cache_key, result, text=strip_text)
+        return result
+
+    async def arun_task_standalone(self, btext, strip=True):
+        import asyncio
+        assert btext is not None
+        tmpdir = str(self.base_dir / "tmp")
+        itmp = tempfile.NamedTemporaryFile(dir=tmpdir, delete=False)
+        otmp = tempfile.NamedTemporaryFile(dir=tmpdir, delete=False)
+        try:
+            itmp.write(btext)
+            itmp.flush()
+            self._count("jvm_spawns_total")
+            with self._span("run_task_standalone"):
+                proc = await asyncio.create_subprocess_exec(
+                    *(await self._alaunch_command() + ["-i", itmp.name, "-o", otmp.name]),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                try:
+                    returncode = await asyncio.wait_for(proc.wait(), self.timeout)
+                except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+                    # do not leave an orphan JVM behind a cancelled call
+                    proc.kill()
+                    await proc.wait()
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._count("timeouts_total")
+                        raise TimeoutError(
+                            f"the [{self.task}] task did not finish within {self.timeout} seconds"
+                        ) from None
+                    raise
+            if returncode == 0:
+                boutput = otmp.read()
+                self._count("bytes_written_total", len(btext))
+                self._count("bytes_read_total", len(boutput))
+                result = boutput.decode("utf8")
+                if strip:
+                    result = result.strip()
+            else:
+                self.logger.critical(f"return code: {returncode}")
+                raise Exception("Internal Error occurred!")
+        finally:
+            itmp.close()
+            otmp.close()
+            os.unlink(itmp.name)
+            os.unlink(otmp.name)
         return result
 
+    async def _alaunch_command(self):
+        import asyncio
+        if not self.class_data_sharing:
+            return self.launch_command
+        # the first launch may build the archive, which runs a JVM, off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: self.launch_command)
+
+    @property
+    def async_workers(self):
+        """The workers of every event loop the asyncio API runs in"""
+        with self._async_pools_lock:
+            return [worker for _, workers in self._async_pools.values() for worker in workers]
+
+    def _async_pool(self, loop):
+        import asyncio
+        # workers, locks and futures are bound to the loop that created them, so every
+        # loop gets its own. the workers of closed loops, as after asyncio.run, are killed
+        with self._async_pools_lock:
+            for closed_loop in [other for other in self._async_pools if other.is_closed()]:
+                for worker in self._async_pools.pop(closed_loop)[1]:
+                    worker.kill()
+            pool = self._async_pools.get(loop)
+            if pool is None:
+                pool = self._async_pools[loop] = (asyncio.Lock(), [])
+        return pool
+
+    async def _ainitialize_task(self):
+        import asyncio
+        lock, pool_workers = self._async_pool(asyncio.get_running_loop())
+        async with lock:
+            if not pool_workers:
+                self.logger.info(
+                    f"initializing [{self.task.upper()}] task asynchronously with {self.workers} worker(s)..."
+                )
+                command = await self._alaunch_command()
+                workers = [
+                    AsyncInteractiveWorker(
+                        command,
+                        self.logger,
+                        window=self.inflight_window,
+                        metrics=self.metrics,
+                        labels=self.metric_labels,
+                    )
+                    for _ in range(self.workers)
+                ]
+                await asyncio.gather(*(worker.start() for worker in workers))
+                pool_workers.extend(workers)
+        return pool_workers
+
+    async def asubmit_lines_interactive(self, strip_text):
+        workers = await self._ainitialize_task()
+        futures = list()
+        for line in strip_text.split("\n"):
+            worker = min(workers, key=lambda worker: len(worker.pending))
+            futures.append(await worker.submit(str.encode(line + "\n")))
+        return futures
+
+    async def agather_lines_interactive(self, futures):
+        import asyncio
+        if self.timeout is None:
+            outputs = [await future for future in futures]
+        else:
+            _, waiting = await asyncio.wait(futures, timeout=self.timeout)
+            if waiting:
+                stalled = self._stalled(self._async_pool(asyncio.get_running_loop())[1])
+                error = self._timed_out(stalled)
+                # nobody will read them, the reader skips cancelled futures
+                for future in waiting:
+                    future.cancel()
+                # reaped, the next submit sees they are gone
+                await asyncio.gather(*(worker.proc.wait() for worker in stalled))
+                raise error
+            outputs = [future.result() for future in futures]
+        return "\n".join(output for output in outputs if output)
+
+    async def ado_task_interactive(self, strip_text):
+        with self._span("run_task_interactive"):
+            futures = await self.asubmit_lines_interactive(strip_text)
+            return await self.agather_lines_interactive(futures)
+
+    async def ado_task_standalone(self, strip_text):
+        import asyncio
+        chunks, joiners = self._split_chunks(strip_text)
+        if len(chunks) == 1:
+            return await self.arun_task_standalone(btext=str.encode(strip_text))
+        outputs = await asyncio.gather(
+            *(self.arun_task_standalone(btext=str.encode(chunk), strip=False) for chunk in chunks)
+        )
+        return self._stitch_chunks(outputs, joiners)
+
+    async def _arun_batch_standalone(self, strip_texts):
+        btext, documents = self._pack_documents(strip_texts)
+        output = await self.arun_task_standalone(btext=btext, strip=False)
+        results = self._unpack_documents(output, documents)
+        if results is None:
+            return [await self.ado_task_standalone(strip_text) for strip_text in strip_texts]
+        return results
+
+    async def ado_batch_standalone(self, strip_texts):
+        import asyncio
+        groups = self._group_documents(strip_texts)
+        outputs = await asyncio.gather(*(self._arun_batch_standalone(group) for group in groups))
+        return [result for results in outputs for result in results]
+
+    async def ado_task(self, text):
+        strip_text = text.strip()
+        cached_result = self._load_from_memory(strip_text)
+        if cached_result is not None:
+            return cached_result
+        with self._span("do_task"):
+            return await self._ado_task_single_flight(strip_text)
+
+    async def _ado_task_single_flight(self, strip_text):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        # keyed by loop too: a future can only be awaited from its own loop, and loops
+        # running in other threads have their own leaders
+        key = (loop, strip_text)
+        inflight = self._ainflight.get(key)
+        if inflight is not None:
+            self._cache_counts["coalesced"] += 1
+            # shielded so that a cancelled follower does not cancel the leader
+            return await asyncio.shield(inflight)
+
+        future = self._ainflight[key] = loop.create_future()
+        try:
+            if self.type_level or self.cache_granularity == "line":
+                result = (await self.ado_task_many([strip_text]))[0]
+                future.set_result(result)
+                return result
+            cache_key = self._get_cache_key(strip_text)
+            result = self._load_from_cache(cache_key)
+            if result is None:
+                if self.interactive:
+                    result = await self.ado_task_interactive(strip_text)
+                else:
+                    result = await self.ado_task_standalone(strip_text)
+                self._save_to_cache(cache_key, result, text=strip_text)
+            self._save_to_memory(strip_text, result)
+            future.set_result(result)
+            return result
+        except BaseException as error:
+            future.set_exception(error)
+            # followers see the error, the leader does not need it retrieved
+            future.exception()
+            raise
+        finally:
+            if self._ainflight.get(key) is future:
+                self._ainflight.pop(key, None)
+
+    async def _arun_many(self, strip_texts):
+        if self.interactive:
+            with self._span("run_task_interactive"):
+                submitted = [await self.asubmit_lines_interactive(strip_text) for strip_text in strip_texts]
+                return [await self.agather_lines_interactive(futures) for futures in submitted]
+        return await self.ado_batch_standalone(strip_texts)
+
+    async def _ado_task_many_by_text(self, texts):
+        results, missed = self._lookup_many(texts)
+        if not missed:
+            return results
+        return self._store_many(results, missed, await self._arun_many(list(missed)))
+
+    async def _ado_task_many_by_line(self, texts):
+        documents = self._split_documents(texts)
+        line_results = await self._ado_task_many_by_text(line for lines in documents for line in lines)
+        return self._join_documents(documents, line_results)
+
+    async def _ado_task_many_by_type(self, texts):
+        documents, found, unseen = self._split_types(texts)
+        if unseen:
+            self._learn_types(found, unseen, await self._ado_task_many_by_text(unseen))
+        return self._join_types(documents, found)
+
+    async def ado_task_many(self, texts):
+        with self._span("do_task_many"):
+            if self.type_level:
+                return await self._ado_task_many_by_type(texts)
+            if self.cache_granularity == "line":
+                return await self._ado_task_many_by_line(texts)
+            return await self._ado_task_many_by_text(texts)
+
+    async def aiter_task(self, texts, batch_size=256):
+        """
+        Yield the results of `texts`, an iterable or an async iterable, in order.
+
+        Texts are processed `batch_size` at a time, and the next batch is only
+        read once the consumer has taken the results of the current one.
+        """
+        batch = list()
+        if hasattr(texts, "__aiter__"):
+            async for text in texts:
+                batch.append(text)
+                if len(batch) >= batch_size:
+                    for result in await self.ado_task_many(batch):
+                        yield result
+                    batch = list()
+        else:
+            for text in texts:
+                batch.append(text)
+                if len(batch) >= batch_size:
+                    for result in await self.ado_task_many(batch):
+                        yield result
+                    batch = list()
+        if batch:
+            for result in await self.ado_task_many(batch):
+                yield result
+
+    async def aterminate(self):
+        import asyncio
+        with self._async_pools_lock:
+            _, workers = self._async_pools.pop(asyncio.get_running_loop(), (None, []))
+        await asyncio.gather(*(worker.terminate() for worker in workers))
+
     def terminate(self):
-        self.task_proc.terminate()
+        for worker in self.task_workers:
+            worker.terminate()
+        with self._async_pools_lock:
+            pools, self._async_pools = self._async_pools, dict()
+        for _, workers in pools.values():
+            for worker in workers:
+                worker.kill()
+        self.flush_cache()
+
+    def flush_cache(self):
+        """Wait for the queued cache writes to reach the disk"""
+        if self.cache_enabled:
+            try:
+                self.cache_backend.flush()
+            except Exception as e:
+                self.logger.warning(f"Failed to flush the cache: {e}")
 
     def clear_cache(self):
         """Clear all cached results for this task"""
@@ -289,70 +1589,161 @@ class FarasaBase:
             self.logger.info("Cache is disabled, nothing to clear.")
             return
         
-        task_cache_dir = self.cache_dir / self.task
-        if task_cache_dir.exists():
-            try:
-                import shutil
-                shutil.rmtree(task_cache_dir)
-                task_cache_dir.mkdir(exist_ok=True)
-                self.logger.info(f"Cache cleared for task: {self.task}")
-            except Exception as e:
-                self.logger.warning(f"Failed to clear cache: {e}")
-        else:
-            self.logger.info(f"No cache directory found for task: {self.task}")
+        try:
+            if self.memory_cache is not None:
+                self.memory_cache.clear()
+            self.cache_backend.clear()
+            self.logger.info(f"Cache cleared for task: {self.task}")
+        except Exception as e:
+            self.logger.warning(f"Failed to clear cache: {e}")
 
-    def _setup_cache(self):
-        """Create cache directory structure"""
+    def _setup_cache(self, cache_backend="json", write_behind=True):
+        """
+        Create the cache backend, `cache_backend` is 'json', 'sqlite' or a CacheBackend.
+
+        With `write_behind`, entries are written by a background thread and
+        results are returned without waiting for the disk.
+        """
         try:
-            self.cache_dir.mkdir(exist_ok=True)
-            task_cache_dir = self.cache_dir / self.task
-            task_cache_dir.mkdir(exist_ok=True)
+            if isinstance(cache_backend, CacheBackend):
+                self.cache_backend = cache_backend
+            elif cache_backend == "json":
+                self.cache_backend = JSONCacheBackend(self.cache_dir / self.task)
+            elif cache_backend == "sqlite":
+                self.cache_backend = SQLiteCacheBackend(self.cache_dir / f"{self.task}.sqlite3")
+            else:
+                raise ValueError(f"unknown cache backend: {cache_backend}")
+            if write_behind and not isinstance(self.cache_backend, WriteBehindCache):
+                self.cache_backend = WriteBehindCache(self.cache_backend)
             self.logger.debug(f"Cache directory set up at {self.cache_dir}")
+        except ValueError:
+            raise
         except Exception as e:
             self.logger.warning(f"Failed to setup cache directory: {e}. Disabling cache.")
             self.cache_enabled = False
 
+    @property
+    def cache_stats(self):
+        """Hit, miss and eviction counters of the memory and disk caches"""
+        stats = {
+            "memory_hits": 0,
+            "memory_misses": 0,
+            "memory_evictions": 0,
+            "memory_entries": 0,
+            "disk_hits": self._cache_counts["disk_hits"],
+            "disk_misses": self._cache_counts["disk_misses"],
+            "coalesced": self._cache_counts["coalesced"],
+            "bundle_hits": self._cache_counts["bundle_hits"],
+            "bundle_misses": self._cache_counts["bundle_misses"],
+        }
+        if self.memory_cache is not None:
+            stats["memory_hits"] = self.memory_cache.hits
+            stats["memory_misses"] = self.memory_cache.misses
+            stats["memory_evictions"] = self.memory_cache.evictions
+            stats["memory_entries"] = len(self.memory_cache)
+        return stats
+
+    def _load_from_memory(self, text):
+        if self.memory_cache is None:
+            return None
+        return self.memory_cache.get(text)
+
+    def _save_to_memory(self, text, result):
+        if self.memory_cache is not None:
+            self.memory_cache.set(text, result)
+
     def _get_cache_key(self, text):
         """Generate a unique cache key for the given text and current configuration"""
         # Include task type, interactive mode, and text content in the hash
         cache_data = f"{self.task}:{'interactive' if self.interactive else 'standalone'}:{text}"
         return hashlib.sha256(cache_data.encode('utf-8')).hexdigest()
 
-    def _get_cache_path(self, cache_key):
-        """Get the full path to the cache file"""
-        return self.cache_dir / self.task / f"{cache_key}.json"
+    def open_bundle(self, bundle):
+        """
+        Look results up in `bundle`, a path or a `ResultsBundle`, before the disk cache.
+
+        A bundle is read-only and shared by every process that opens it, see
+        `export_bundle`. Its keys include the mode, a bundle exported from a
+        standalone task does not answer an interactive one.
+        """
+        if not isinstance(bundle, ResultsBundle):
+            bundle = ResultsBundle(bundle)
+        task = bundle.metadata.get("task")
+        if task is not None and task != self.task:
+            self.logger.warning(f"the bundle {bundle.path} holds [{task}] results, not [{self.task}] ones")
+        self.bundle = bundle
+        return bundle
+
+    def export_bundle(self, path):
+        """
+        Write every entry of the disk cache into a bundle at `path`.
+
+        Processes that open it with `bundle=path` share its pages through the
+        OS page cache instead of each reading the cache files.
+        """
+        assert self.cache_enabled, "the cache is disabled, there is nothing to export"
+        items = ((cache_key, result) for cache_key, _, result in self.cache_backend.items())
+        metadata = {"task": self.task, "mode": "interactive" if self.interactive else "standalone"}
+        return write_bundle(path, items, metadata=metadata)
+
+    def _load_from_bundle(self, cache_keys):
+        found = self.bundle.get_many(cache_keys)
+        self._cache_counts["bundle_hits"] += len(found)
+        self._cache_counts["bundle_misses"] += len(cache_keys) - len(found)
+        self._count("cache_hits_total", len(found), tier="bundle")
+        self._count("cache_misses_total", len(cache_keys) - len(found), tier="bundle")
+        return found
 
     def _load_from_cache(self, cache_key):
         """Load result from cache if it exists"""
+        if self.bundle is not None:
+            result = self._load_from_bundle([cache_key]).get(cache_key)
+            if result is not None:
+                return result
         if not self.cache_enabled:
             return None
         
-        cache_path = self._get_cache_path(cache_key)
-        if cache_path.exists():
-            try:
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    # Get the first (and only) value from the key-value pair
-                    result = next(iter(cache_data.values()))
-                    self.logger.debug(f"Cache hit for key: {cache_key[:8]}...")
-                    return result
-            except Exception as e:
-                self.logger.warning(f"Failed to load from cache: {e}")
-        return None
+        try:
+            result = self.cache_backend.get(cache_key)
+        except Exception as e:
+            self.logger.warning(f"Failed to load from cache: {e}")
+            return None
+        if result is not None:
+            self._cache_counts["disk_hits"] += 1
+            self._count("cache_hits_total", tier="disk")
+            self.logger.debug(f"Cache hit for key: {cache_key[:8]}...")
+        else:
+            self._cache_counts["disk_misses"] += 1
+            self._count("cache_misses_total", tier="disk")
+        return result
+
+    def _load_many_from_cache(self, cache_keys):
+        """Load the results of many keys at once, missing keys are left out"""
+        bundled = dict()
+        if self.bundle is not None:
+            bundled = self._load_from_bundle(cache_keys)
+            cache_keys = [cache_key for cache_key in cache_keys if cache_key not in bundled]
+        if not self.cache_enabled or not cache_keys:
+            return bundled
+        try:
+            found = self.cache_backend.get_many(cache_keys)
+        except Exception as e:
+            self.logger.warning(f"Failed to load from cache: {e}")
+            return bundled
+        self._cache_counts["disk_hits"] += len(found)
+        self._cache_counts["disk_misses"] += len(cache_keys) - len(found)
+        self._count("cache_hits_total", len(found), tier="disk")
+        self._count("cache_misses_total", len(cache_keys) - len(found), tier="disk")
+        found.update(bundled)
+        return found
 
-    def _save_to_cache(self, cache_key, result):
+    def _save_to_cache(self, cache_key, result, text):
         """Save result to cache"""
         if not self.cache_enabled:
             return
         
-        cache_path = self._get_cache_path(cache_key)
         try:
-            # Get the original text from the current task
-            original_text = getattr(self, '_current_text', '')
-            cache_data = {original_text: result}
-            
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-                self.logger.debug(f"Cached result for key: {cache_key[:8]}...")
+            self.cache_backend.set(cache_key, text, result)
+            self.logger.debug(f"Cached result for key: {cache_key[:8]}...")
         except Exception as e:
             self.logger.warning(f"Failed to save to cache: {e}")
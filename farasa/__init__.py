@@ -1,7 +1,32 @@
-from .diacratizer import FarasaDiacritizer
-from .ner import FarasaNamedEntityRecognizer
-from .pos import FarasaPOSTagger
-from .segmenter import FarasaSegmenter
-from .spellchecker import FarasaSpellChecker
-from .stemmer import FarasaStemmer
-from .lemmatizer import FarasaLemmatizer
+"""
+The task classes are imported on first use, `import farasa` loads none of
+them, nor their dependencies, until one is asked for.
+"""
+import importlib
+
+_EXPORTS = {
+    "FarasaDiacritizer": ".diacratizer",
+    "FarasaNamedEntityRecognizer": ".ner",
+    "FarasaPOSTagger": ".pos",
+    "FarasaSegmenter": ".segmenter",
+    "FarasaSpellChecker": ".spellchecker",
+    "FarasaStemmer": ".stemmer",
+    "FarasaLemmatizer": ".lemmatizer",
+    "FarasaPipeline": ".pipeline",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    # later lookups find it in the module without coming back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,545 @@
+"""
+Benchmarks of farasapy.
+
+Run them with `python -m farasa.bench`. The micro benchmarks time the
+internals in microseconds per operation. With `--tasks`, every task class
+is timed end to end against `fakejar.py`, a stand-in for the jars, so the
+numbers need neither java nor the network and only move when farasapy does.
+"""
+import argparse
+import hashlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .bundle import ResultsBundle, write_bundle
+from .cache import JSONCacheBackend, SQLiteCacheBackend
+
+sample_text = "يُشار إلى أن اللغة العربية يتحدثها أكثر من 422 مليون نسمة"
+sample_result = "يشار إلى أن ال+لغ+ة ال+عربي+ة يتحدث+ها أكثر من 422 مليون نسم+ة"
+
+
+def _per_op_us(started, count):
+    return (time.perf_counter() - started) / max(count, 1) * 1e6
+
+
+def bench_cache_backends(entries=2000):
+    """Compare insert, hit and miss latency of the cache backends and of a results bundle."""
+    keys = [hashlib.sha256(f"hit:{i}".encode()).hexdigest() for i in range(entries)]
+    missing_keys = [hashlib.sha256(f"miss:{i}".encode()).hexdigest() for i in range(entries)]
+    report = dict()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backends = {
+            "json": JSONCacheBackend(Path(tmpdir) / "json"),
+            "sqlite": SQLiteCacheBackend(Path(tmpdir) / "cache.sqlite3"),
+        }
+        for name, backend in backends.items():
+            started = time.perf_counter()
+            for i, key in enumerate(keys):
+                backend.set(key, f"{sample_text} {i}", f"{sample_result} {i}")
+            backend.flush()
+            insert_us = _per_op_us(started, entries)
+
+            started = time.perf_counter()
+            for key in keys:
+                assert backend.get(key) is not None
+            hit_us = _per_op_us(started, entries)
+
+            started = time.perf_counter()
+            for key in missing_keys:
+                assert backend.get(key) is None
+            miss_us = _per_op_us(started, entries)
+
+            started = time.perf_counter()
+            backend.clear()
+            clear_us = _per_op_us(started, 1)
+            backend.close()
+            report[name] = {
+                "insert_us": insert_us,
+                "hit_us": hit_us,
+                "miss_us": miss_us,
+                "clear_us": clear_us,
+            }
+
+        # a bundle is written once, its insert time is the export of every entry
+        bundle_path = Path(tmpdir) / "results.bundle"
+        started = time.perf_counter()
+        write_bundle(bundle_path, ((key, f"{sample_result} {i}") for i, key in enumerate(keys)))
+        insert_us = _per_op_us(started, entries)
+        with ResultsBundle(bundle_path) as bundle:
+            started = time.perf_counter()
+            for key in keys:
+                assert bundle.get(key) is not None
+            hit_us = _per_op_us(started, entries)
+            started = time.perf_counter()
+            for key in missing_keys:
+                assert bundle.get(key) is None
+            miss_us = _per_op_us(started, entries)
+        report["bundle"] = {"insert_us": insert_us, "hit_us": hit_us, "miss_us": miss_us}
+    return report
+
+
+def sample_tagged_text(words=100000):
+    """A POS tagger output of about `words` words, segmented words and dates included."""
+    pieces = ["يشار/V-MS", "ال+ لغ +ة/DET+NOUN+NSUFF-FS", "19/5/1955/NUM", "إلى/PREP", "ب+ ال+ عربي/PREP+DET+ADJ-MS"]
+    return " ".join(["S/S", *(pieces[i % len(pieces)] for i in range(words)), "E/E"])
+
+
+class _LegacyTaggedToken:
+    """The token model of farasapy 0.0.14, kept as the baseline of `bench_pos_parser`."""
+
+    def __init__(self, token, tag):
+        self.tokens, self.tags = [token], [tag]
+
+    def append_connected_token(self, token, tag):
+        self.tokens.append(token)
+        self.tags.append(tag)
+
+    def as_tuple(self):
+        processed_tags = list()
+        for tag in self.tags:
+            subtags = tag.split("-")
+            processed_tags.append([subtags[0], *(tuple(subtag) for subtag in subtags[1:])])
+        return ("".join(token.strip() for token in self.tokens).replace("+", ""), tuple(processed_tags))
+
+
+def _legacy_tag_segments(tagged_text, combine_subtokens=False):
+    tokens_objects = list()
+    subtokens = list()
+    for tagged_token in tagged_text.split()[1:-1]:
+        slash_count = 0
+        for c in tagged_token:
+            if c == "/":
+                slash_count += 1
+        if slash_count == 0:
+            subtokens.append(tagged_token)
+        elif slash_count > 1:
+            token = "/".join(tagged_token.split("/")[0:-1])
+            tag = tagged_token.split("/")[-1]
+            tokens_objects.append(_LegacyTaggedToken(token, tag))
+        else:
+            temp_token, temp_tag = tagged_token.split("/")
+            if len(subtokens) > 0:
+                subtokens.append(temp_token)
+                temp_tags = temp_tag.split("+")
+                if combine_subtokens:
+                    tokens_object = _LegacyTaggedToken(subtokens[0], temp_tags[0])
+                    for _token, _tag in zip(subtokens[1:], temp_tags[1:]):
+                        tokens_object.append_connected_token(_token, _tag)
+                    tokens_objects.append(tokens_object)
+                else:
+                    for _token, _tag in zip(subtokens, temp_tags):
+                        tokens_objects.append(_LegacyTaggedToken(_token, _tag))
+                subtokens = list()
+            else:
+                tokens_objects.append(_LegacyTaggedToken(temp_token, temp_tag))
+    return tokens_objects
+
+
+def bench_pos_parser(words=100000):
+    """
+    Compare the POS output parser with the one of farasapy 0.0.14.
+
+    `parse` turns the tagged text into token objects, `as_tuple` reads every
+    token twice, as a caller looping over the results would.
+    """
+    from .pos import iter_tagged_tokens
+
+    tagged_text = sample_tagged_text(words)
+    report = dict()
+    for name, parse in (
+        ("legacy", _legacy_tag_segments),
+        ("current", lambda text: list(iter_tagged_tokens(text))),
+    ):
+        started = time.perf_counter()
+        tokens = parse(tagged_text)
+        parse_us = _per_op_us(started, words)
+        started = time.perf_counter()
+        for _ in range(2):
+            for token in tokens:
+                token.as_tuple()
+        report[name] = {"parse_us": parse_us, "as_tuple_us": _per_op_us(started, 2 * len(tokens))}
+    return report
+
+
+def bench_columnar(words=100000):
+    """
+    Compare the memory held by POS results as token objects and as a `TaggedBatch`.
+
+    Sizes are in bytes per token, measured with tracemalloc.
+    """
+    import tracemalloc
+
+    from .columnar import TagVocabulary, TaggedBatch
+    from .pos import iter_tagged_pairs, iter_tagged_tokens
+
+    # one sentence per 20 words
+    sentences = [sample_tagged_text(20) for _ in range(max(words // 20, 1))]
+    report = dict()
+    for name, build in (
+        ("tagged_tokens", lambda: [list(iter_tagged_tokens(sentence)) for sentence in sentences]),
+        ("tuples", lambda: [[token.as_tuple() for token in iter_tagged_tokens(sentence)] for sentence in sentences]),
+        (
+            "columnar",
+            lambda: TaggedBatch.from_sentences((iter_tagged_pairs(sentence) for sentence in sentences), TagVocabulary()),
+        ),
+    ):
+        tracemalloc.start()
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tokens = sum(len(sentence) for sentence in result) if isinstance(result, list) else len(result)
+        report[name] = {"bytes_per_token": size / tokens}
+        del result
+    return report
+
+
+def bench_desegmenter(lines=100000, jobs=4):
+    """
+    Compare the desegmentation of segmented lines, in microseconds per line.
+
+    `per_word` runs the rules word by word, as `desegment` used to.
+    """
+    from .segmenter import desegment_word, iter_desegment
+
+    segmented_lines = [f"{sample_result} {i}" for i in range(lines)]
+    report = dict()
+    for name, desegment in (
+        ("per_word", lambda: [" ".join(desegment_word(word) for word in line.split(" ")) for line in segmented_lines]),
+        ("rule_engine", lambda: list(iter_desegment(segmented_lines))),
+        (f"rule_engine_{jobs}_jobs", lambda: list(iter_desegment(segmented_lines, jobs=jobs))),
+    ):
+        started = time.perf_counter()
+        desegment()
+        report[name] = {"us_per_line": _per_op_us(started, lines)}
+    return report
+
+
+def bench_construction(task_classes=None, repeat=3, **task_kwargs):
+    """
+    Time the construction of task objects, in milliseconds per object.
+
+    `cold` forgets the java and binaries checks before every object, as the
+    first object of a process does. `memoized` reuses them. `lazy` is an
+    interactive object whose JVM starts on first use, against `eager`.
+    """
+    from . import __base as base
+    from .diacratizer import FarasaDiacritizer
+    from .ner import FarasaNamedEntityRecognizer
+    from .pos import FarasaPOSTagger
+    from .segmenter import FarasaSegmenter
+    from .stemmer import FarasaStemmer
+
+    if task_classes is None:
+        task_classes = (
+            FarasaSegmenter,
+            FarasaStemmer,
+            FarasaPOSTagger,
+            FarasaNamedEntityRecognizer,
+            FarasaDiacritizer,
+        )
+    task_kwargs.setdefault("logging_level", "ERROR")
+    report = dict()
+    for task_class in task_classes:
+        timings = dict()
+        for name, clear, extra in (
+            ("cold_ms", True, dict()),
+            ("memoized_ms", False, dict()),
+            ("eager_ms", False, dict(interactive=True)),
+            ("lazy_ms", False, dict(interactive=True, lazy=True)),
+        ):
+            elapsed = 0
+            for _ in range(repeat):
+                if clear:
+                    base.clear_environment_probes()
+                started = time.perf_counter()
+                task = task_class(**task_kwargs, **extra)
+                elapsed += time.perf_counter() - started
+                if task.interactive:
+                    task.terminate()
+            timings[name] = elapsed / repeat * 1e3
+        report[task_class.__name__] = timings
+    return report
+
+
+def bench_jvm_startup(task_classes=None, repeat=3, **task_kwargs):
+    """
+    Time a standalone call on one word, the start of a JVM, in milliseconds.
+
+    `plain` is the default launch, `cds` a launch with the class-data-sharing
+    archive of the jar, `cds_build` the one-off run that builds it and
+    `tiered1` a launch with the C1 compiler only. Needs java 13+ and the jars.
+    """
+    from .diacratizer import FarasaDiacritizer
+    from .ner import FarasaNamedEntityRecognizer
+    from .pos import FarasaPOSTagger
+    from .segmenter import FarasaSegmenter
+    from .stemmer import FarasaStemmer
+
+    if task_classes is None:
+        task_classes = (
+            FarasaSegmenter,
+            FarasaStemmer,
+            FarasaPOSTagger,
+            FarasaNamedEntityRecognizer,
+            FarasaDiacritizer,
+        )
+    task_kwargs.setdefault("logging_level", "ERROR")
+    report = dict()
+    for task_class in task_classes:
+        timings = dict()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for name, extra in (
+                ("plain_ms", dict()),
+                ("cds_ms", dict(class_data_sharing=True)),
+                ("tiered1_ms", dict(jvm_options=["-XX:TieredStopAtLevel=1"])),
+            ):
+                task = task_class(cache=False, cache_dir=cache_dir, **task_kwargs, **extra)
+                if task.class_data_sharing:
+                    started = time.perf_counter()
+                    task.launch_command
+                    timings["cds_build_ms"] = (time.perf_counter() - started) * 1e3
+                elapsed = 0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    task.do_task(sample_text.split()[0])
+                    elapsed += time.perf_counter() - started
+                timings[name] = elapsed / repeat * 1e3
+        report[task_class.__name__] = timings
+    return report
+
+
+FAKE_JAR = Path(__file__).parent / "fakejar.py"
+_placeholder_bin_dir = None
+
+
+def _fake_bin_dir():
+    """A directory of empty jars, so that the binaries check passes without the download."""
+    global _placeholder_bin_dir
+    if _placeholder_bin_dir is None:
+        import atexit
+        import shutil
+
+        bin_dir = Path(tempfile.mkdtemp(prefix="farasa_fake_bin_"))
+        for jar in ("FarasaNERJar.jar", "FarasaPOSJar.jar", "FarasaDiacritizeJar.jar", "lib/FarasaSegmenterJar.jar"):
+            (bin_dir / jar).parent.mkdir(exist_ok=True)
+            (bin_dir / jar).touch()
+        atexit.register(shutil.rmtree, bin_dir, True)
+        _placeholder_bin_dir = bin_dir
+    return _placeholder_bin_dir
+
+
+def _task_classes():
+    from .diacratizer import FarasaDiacritizer
+    from .lemmatizer import FarasaLemmatizer
+    from .ner import FarasaNamedEntityRecognizer
+    from .pos import FarasaPOSTagger
+    from .segmenter import FarasaSegmenter
+    from .spellchecker import FarasaSpellChecker
+    from .stemmer import FarasaStemmer
+
+    return (
+        FarasaSegmenter,
+        FarasaStemmer,
+        FarasaPOSTagger,
+        FarasaNamedEntityRecognizer,
+        FarasaDiacritizer,
+        FarasaLemmatizer,
+        FarasaSpellChecker,
+    )
+
+
+def fake_task_class(task_class, startup=0.0, per_line=0.0, per_char=0.0, extra_args=()):
+    """
+    Subclass `task_class` to run `fakejar.py` instead of its jar.
+
+    The subclass runs the real java and binaries checks, against the fake jar
+    answering `-version` and a directory of empty jars. `startup` imitates the
+    start of a JVM, `per_line` and `per_char` the cost of the work, in seconds.
+    `extra_args` are more options of the fake jar, such as `--hang-after 10`.
+    """
+    command = [sys.executable, str(FAKE_JAR), "--task", task_class.task]
+    command += ["--startup", str(startup), "--per-line", str(per_line), "--per-char", str(per_char)]
+    command += list(extra_args)
+    return type(
+        f"Fake{task_class.__name__}",
+        (task_class,),
+        {
+            "command": property(lambda self: list(command)),
+            "JAVA_VERSION_CMD": [sys.executable, str(FAKE_JAR), "-version"],
+            "bin_dir": _fake_bin_dir(),
+            # the real jars of some tasks are not downloadable
+            "is_downloadable": True,
+        },
+    )
+
+
+def bench_tasks(
+    task_classes=None,
+    fake=True,
+    startup=0.0,
+    per_line=0.0,
+    calls=5,
+    lines=500,
+    cache_lookups=200,
+    document_chars=(1000, 10000, 100000),
+):
+    """
+    Time every task class end to end.
+
+    - `construction_ms`: a standalone object, the environment checks included:
+      the version probe forks a process and the binaries are looked up.
+    - `standalone_ms`: one call in standalone mode.
+    - `interactive_lines_s`: lines per second of `do_task_many` in interactive mode.
+    - `memory_hit_us`, `disk_hit_us`, `miss_us`: lookups of the cache tiers.
+    - `doc_<chars>_ms`: one standalone call on a document of about that size.
+    """
+    from . import __base as base
+
+    if task_classes is None:
+        task_classes = _task_classes()
+    report = dict()
+    for task_class in task_classes:
+        task_type = fake_task_class(task_class, startup, per_line) if fake else task_class
+        timings = dict()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            options = dict(logging_level="ERROR", cache_dir=cache_dir)
+
+            base.clear_environment_probes()
+            started = time.perf_counter()
+            task = task_type(cache=False, **options)
+            timings["construction_ms"] = (time.perf_counter() - started) * 1e3
+
+            started = time.perf_counter()
+            for i in range(calls):
+                task.do_task(f"{sample_text} {i}")
+            timings["standalone_ms"] = _per_op_us(started, calls) / 1e3
+
+            # the spell checker runs in standalone mode only
+            if task_class.task != "spell_check":
+                interactive_task = task_type(interactive=True, cache=False, **options)
+                try:
+                    texts = [f"{sample_text} {i}" for i in range(lines)]
+                    started = time.perf_counter()
+                    interactive_task.do_task_many(texts)
+                    timings["interactive_lines_s"] = lines / (time.perf_counter() - started)
+                finally:
+                    interactive_task.terminate()
+
+            cached_task = task_type(cache=True, **options)
+            cached_task.do_task(sample_text)
+            started = time.perf_counter()
+            for _ in range(cache_lookups):
+                cached_task.do_task(sample_text)
+            timings["memory_hit_us"] = _per_op_us(started, cache_lookups)
+            # the entry is written behind, it has to be on disk before the disk hits
+            cached_task.flush_cache()
+            disk_task = task_type(cache=True, memory_cache_entries=0, **options)
+            disk_task.do_task(sample_text)
+            started = time.perf_counter()
+            for _ in range(cache_lookups):
+                disk_task.do_task(sample_text)
+            timings["disk_hit_us"] = _per_op_us(started, cache_lookups)
+            missing_keys = [disk_task._get_cache_key(f"{sample_text} {i}") for i in range(cache_lookups)]
+            started = time.perf_counter()
+            for key in missing_keys:
+                disk_task._load_from_cache(key)
+            timings["miss_us"] = _per_op_us(started, cache_lookups)
+
+            for chars in document_chars:
+                document = "\n".join([sample_text] * max(chars // len(sample_text), 1))
+                started = time.perf_counter()
+                task.do_task(document)
+                timings[f"doc_{chars}_ms"] = (time.perf_counter() - started) * 1e3
+        report[task_class.__name__] = timings
+    return report
+
+
+def bench_inflight_window(task_class=None, fake=True, per_line=0.0, lines=2000, windows=(1, 64), repeat=3):
+    """
+    Time one interactive document of `lines` lines for every in-flight window.
+
+    A window of 1 is the lock-step protocol, a line written only once the
+    output of the previous one is read. Larger windows keep that many lines
+    in the pipe while the reader thread collects the outputs. Reports the
+    best of `repeat` runs in lines per second.
+    """
+    if task_class is None:
+        from .segmenter import FarasaSegmenter
+
+        task_class = FarasaSegmenter
+    task_type = fake_task_class(task_class, per_line=per_line) if fake else task_class
+    # distinct lines, the same document for every window
+    document = "\n".join(f"{sample_text} {i}" for i in range(lines))
+    timings = dict()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for window in windows:
+            task = task_type(
+                interactive=True, cache=False, inflight_window=window, logging_level="ERROR", cache_dir=cache_dir
+            )
+            try:
+                # the JVM start is left out
+                task.do_task(sample_text)
+                best = float("inf")
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    task.do_task(document)
+                    best = min(best, time.perf_counter() - started)
+                timings[f"window_{window}_lines_s"] = lines / best
+            finally:
+                task.terminate()
+    return {task_class.__name__: timings}
+
+
+def print_report(title, report):
+    print(f"\n{title}")
+    for name, timings in report.items():
+        cells = "  ".join(f"{metric}={value:10.1f}" for metric, value in timings.items())
+        print(f"  {name:<28} {cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="farasapy micro benchmarks")
+    parser.add_argument("--entries", type=int, default=2000, help="cache entries to insert")
+    parser.add_argument(
+        "--construction", action="store_true", help="also time task construction, needs java and the jars"
+    )
+    parser.add_argument(
+        "--jvm-startup", action="store_true", help="also time JVM launches with and without class data sharing"
+    )
+    parser.add_argument("--tasks", action="store_true", help="also time every task class end to end")
+    parser.add_argument(
+        "--inflight", action="store_true", help="also time an interactive document in lock-step and pipelined"
+    )
+    parser.add_argument("--real", action="store_true", help="time the tasks on java and the jars, not the fake jar")
+    parser.add_argument("--startup", type=float, default=0.0, help="seconds the fake jar takes to start")
+    parser.add_argument("--per-line", type=float, default=0.0, help="seconds the fake jar takes per line")
+    parser.add_argument("--lines", type=int, default=100000, help="lines of the desegmentation sample")
+    parser.add_argument("--words", type=int, default=100000, help="words of the POS parser sample")
+    args = parser.parse_args(argv)
+    print_report(
+        f"cache backends, {args.entries} entries (us/op)",
+        bench_cache_backends(entries=args.entries),
+    )
+    print_report(f"POS output parser, {args.words} words (us/word)", bench_pos_parser(words=args.words))
+    print_report(f"POS results in memory, {args.words} words", bench_columnar(words=args.words))
+    print_report(f"desegmentation, {args.lines} lines", bench_desegmenter(lines=args.lines))
+    if args.construction:
+        print_report("task construction (ms/object)", bench_construction())
+    if args.jvm_startup:
+        print_report("standalone call on one word (ms/call)", bench_jvm_startup())
+    if args.inflight:
+        print_report(
+            "interactive document, lock-step against pipelined (lines/s)",
+            bench_inflight_window(fake=not args.real, per_line=args.per_line),
+        )
+    if args.tasks:
+        print_report(
+            "tasks on java" if args.real else f"tasks on the fake jar, startup {args.startup}s",
+            bench_tasks(fake=not args.real, startup=args.startup, per_line=args.per_line),
+        )
+
+
+if __name__ == "__main__":
+    main()
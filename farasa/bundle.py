@@ -0,0 +1,190 @@
+"""
+Read-only bundles of precomputed results, looked up through `mmap`.
+
+A bundle is one immutable file holding the results of a task keyed like its
+cache. Every process that opens it maps the same pages of the OS page cache,
+so 32 workers share a single copy, and a lookup is a binary search over the
+mapped keys without any system call once the pages are in memory.
+
+Layout, little endian:
+
+- header: magic, format version, metadata length, entry count, fanout bits
+- metadata: a UTF-8 JSON object, such as the task it was exported from
+- fanout: for every value of the first `bits` bits of a key, the index of
+  the first key starting with it or a greater value, so that a lookup only
+  searches the keys that share its prefix, about one
+- keys: the 32 byte SHA-256 cache keys, sorted
+- offsets and lengths: where the result of the key with the same index is,
+  relative to the start of the results
+- results: the UTF-8 results
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+
+MAGIC = b"FARASAPY"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQI")
+KEY_SIZE = 32
+MAX_FANOUT_BITS = 16
+
+
+class BundleError(Exception):
+    pass
+
+
+def write_bundle(path, items, metadata=None):
+    """
+    Write the `(key, result)` pairs of `items` into a bundle at `path`.
+
+    Keys are the hex digests of the cache, a repeated key keeps its last
+    result. Results are streamed to a temporary file as they come, only the
+    index is kept in memory. The bundle replaces `path` atomically, processes
+    that have the old one open keep reading it.
+    """
+    _check_platform()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index = dict()
+    with tempfile.TemporaryFile(dir=path.parent) as results:
+        size = 0
+        for key, result in items:
+            bresult = result.encode("utf-8")
+            results.write(bresult)
+            index[bytes.fromhex(key)] = (size, len(bresult))
+            size += len(bresult)
+        keys = sorted(index)
+        bits = min(MAX_FANOUT_BITS, max(0, len(keys).bit_length() - 1))
+        prefixes = [_prefix(key, bits) for key in keys]
+        fanout = array("I", (bisect.bisect_left(prefixes, prefix) for prefix in range(2**bits + 1)))
+        offsets = array("Q", (index[key][0] for key in keys))
+        lengths = array("I", (index[key][1] for key in keys))
+        bmetadata = json.dumps(metadata or dict(), ensure_ascii=False).encode("utf-8")
+        fd, staging = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as bundle:
+                bundle.write(HEADER.pack(MAGIC, VERSION, len(bmetadata), len(keys), bits))
+                bundle.write(bmetadata)
+                bundle.write(fanout.tobytes())
+                bundle.write(b"".join(keys))
+                bundle.write(offsets.tobytes())
+                bundle.write(lengths.tobytes())
+                results.seek(0)
+                while True:
+                    chunk = results.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    bundle.write(chunk)
+            os.replace(staging, path)
+        except BaseException:
+            os.unlink(staging)
+            raise
+    return path
+
+
+def _prefix(bkey, bits):
+    return int.from_bytes(bkey[:4], "big") >> (32 - bits)
+
+
+def _check_platform():
+    # offsets and lengths are written and read in the native layout of array and memoryview
+    if sys.byteorder != "little" or array("Q").itemsize != 8 or array("I").itemsize != 4:
+        raise BundleError("bundles need a little endian platform with 64 bit offsets and 32 bit lengths")
+
+
+class _Keys:
+    # the sorted keys of a bundle as a sequence, for bisect
+    __slots__ = ("buffer", "start", "count")
+
+    def __init__(self, buffer, start, count):
+        self.buffer = buffer
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        start = self.start + index * KEY_SIZE
+        return self.buffer[start : start + KEY_SIZE]
+
+
+class ResultsBundle:
+    """A bundle opened read-only, a mapping of cache keys to results."""
+
+    def __init__(self, path):
+        _check_platform()
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            # an empty file cannot be mapped
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise BundleError(f"{self.path} is not a farasapy bundle")
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, metadata_length, count, self.bits = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise BundleError(f"{self.path} is not a farasapy bundle")
+        if version != VERSION:
+            raise BundleError(f"{self.path} has the format version {version}, this farasapy reads {VERSION}")
+        start = HEADER.size
+        self.metadata = json.loads(self.buffer[start : start + metadata_length].decode("utf-8"))
+        start += metadata_length
+        self.fanout = memoryview(self.buffer)[start : start + (2**self.bits + 1) * 4].cast("I")
+        start += (2**self.bits + 1) * 4
+        self.keys = _Keys(self.buffer, start, count)
+        start += count * KEY_SIZE
+        self.offsets = memoryview(self.buffer)[start : start + count * 8].cast("Q")
+        start += count * 8
+        self.lengths = memoryview(self.buffer)[start : start + count * 4].cast("I")
+        self.results_start = start + count * 4
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _index(self, key):
+        bkey = bytes.fromhex(key)
+        prefix = _prefix(bkey, self.bits)
+        index = bisect.bisect_left(self.keys, bkey, self.fanout[prefix], self.fanout[prefix + 1])
+        if index < len(self.keys) and self.keys[index] == bkey:
+            return index
+        return None
+
+    def get(self, key):
+        index = self._index(key)
+        if index is None:
+            return None
+        start = self.results_start + self.offsets[index]
+        return self.buffer[start : start + self.lengths[index]].decode("utf-8")
+
+    def get_many(self, keys):
+        """Return a dict of the found keys only."""
+        found = dict()
+        for key in keys:
+            result = self.get(key)
+            if result is not None:
+                found[key] = result
+        return found
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def __iter__(self):
+        for index in range(len(self.keys)):
+            yield self.keys[index].hex()
+
+    def close(self):
+        self.fanout.release()
+        self.offsets.release()
+        self.lengths.release()
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
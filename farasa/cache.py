@@ -0,0 +1,478 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger("farasapy_logger")
+
+# the SQLite backends that may hold buffered entries, written at exit
+_open_sqlite_backends = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_backends():
+    for backend in list(_open_sqlite_backends):
+        try:
+            backend.flush()
+        except Exception as e:
+            logger.warning(f"Failed to flush {backend.path} at exit: {e}")
+
+
+class CacheBackend:
+    """
+    The persistent store behind the cache of a task.
+
+    Keys are the hex digests built by `FarasaBase._get_cache_key`. Every entry
+    keeps the source text next to its result so that the cache stays readable.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """Return a dict of the found keys only."""
+        found = dict()
+        for key in keys:
+            result = self.get(key)
+            if result is not None:
+                found[key] = result
+        return found
+
+    def set(self, key, text, result):
+        raise NotImplementedError
+
+    def set_many(self, items):
+        """Store an iterable of `(key, text, result)` tuples."""
+        for key, text, result in items:
+            self.set(key, text, result)
+
+    def items(self):
+        """Yield every entry as a `(key, text, result)` tuple."""
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class JSONCacheBackend(CacheBackend):
+    """One pretty printed `{text: result}` JSON file per cached text."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key):
+        return self.directory / f"{key}.json"
+
+    def get(self, key):
+        cache_path = self.path(key)
+        if cache_path.exists():
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    cache_data = json.load(f)
+                    # Get the first (and only) value from the key-value pair
+                    return next(iter(cache_data.values()))
+            except Exception as e:
+                logger.warning(f"Failed to load from cache: {e}")
+        return None
+
+    def set(self, key, text, result):
+        cache_path = self.path(key)
+        # written aside then renamed, readers in other processes see the old file or the new one
+        staging = self.directory / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(staging, "w", encoding="utf-8") as f:
+                json.dump({text: result}, f, ensure_ascii=False, indent=2)
+            os.replace(staging, cache_path)
+        except BaseException:
+            staging.unlink(missing_ok=True)
+            raise
+
+    def items(self):
+        for cache_path in self.directory.glob("*.json"):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    (text, result), = json.load(f).items()
+            except Exception as e:
+                logger.warning(f"skipping the unreadable cache file {cache_path}: {e}")
+                continue
+            yield cache_path.stem, text, result
+
+    def clear(self):
+        shutil.rmtree(self.directory)
+        self.directory.mkdir(exist_ok=True)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    All the entries of a task in a single SQLite file.
+
+    Writes are buffered and committed `batch_size` at a time, and lookups see
+    the buffered entries before they reach the disk. Values longer than
+    `compress_above` bytes are stored zlib compressed. When `max_entries` is
+    set, the least recently used entries are evicted on every flush.
+    """
+
+    RAW, ZLIB = b"r", b"z"
+
+    def __init__(self, path, max_entries=None, batch_size=256, compress_above=256):
+        # only the objects that use it pay for the import
+        import sqlite3
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.compress_above = compress_above
+        self.lock = threading.RLock()
+        self.pending = dict()
+        self.touched = dict()
+        self.connection = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        # WAL lets other processes read while this one writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, text BLOB NOT NULL, result BLOB NOT NULL, used REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        _open_sqlite_backends.add(self)
+
+    def _encode(self, value):
+        bvalue = value.encode("utf-8")
+        if len(bvalue) > self.compress_above:
+            return self.ZLIB + zlib.compress(bvalue)
+        return self.RAW + bvalue
+
+    def _decode(self, bvalue):
+        bvalue = bytes(bvalue)
+        if bvalue[:1] == self.ZLIB:
+            return zlib.decompress(bvalue[1:]).decode("utf-8")
+        return bvalue[1:].decode("utf-8")
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        found = dict()
+        with self.lock:
+            bkeys = list()
+            for key in keys:
+                if key in self.pending:
+                    found[key] = self.pending[key][1]
+                else:
+                    bkeys.append(bytes.fromhex(key))
+            # stay below the default limit of bound parameters per statement
+            for start in range(0, len(bkeys), 500):
+                chunk = bkeys[start : start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, result FROM entries WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                now = time.time()
+                for bkey, bresult in rows:
+                    key = bytes(bkey).hex()
+                    found[key] = self._decode(bresult)
+                    if self.max_entries is not None:
+                        self.touched[key] = now
+        return found
+
+    def set(self, key, text, result):
+        self.set_many([(key, text, result)])
+
+    def set_many(self, items):
+        with self.lock:
+            for key, text, result in items:
+                self.pending[key] = (text, result)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending and not self.touched:
+                return
+            now = time.time()
+            rows = [
+                (bytes.fromhex(key), self._encode(text), self._encode(result), now)
+                for key, (text, result) in self.pending.items()
+            ]
+            touched = [(used, bytes.fromhex(key)) for key, used in self.touched.items()]
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entries (key, text, result, used) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self.connection.executemany("UPDATE entries SET used = ? WHERE key = ?", touched)
+                if self.max_entries is not None:
+                    self._evict()
+            self.pending.clear()
+            self.touched.clear()
+
+    def items(self):
+        self.flush()
+        with self.lock:
+            rows = self.connection.execute("SELECT key, text, result FROM entries").fetchall()
+        for bkey, btext, bresult in rows:
+            yield bytes(bkey).hex(), self._decode(btext), self._decode(bresult)
+
+    def _evict(self):
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def __len__(self):
+        self.flush()
+        with self.lock:
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return count
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.touched.clear()
+            self.connection.execute("DELETE FROM entries")
+            self.connection.execute("VACUUM")
+
+    def close(self):
+        _open_sqlite_backends.discard(self)
+        with self.lock:
+            if self.connection is None:
+                return
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    def __del__(self):
+        # a backend dropped without close() still writes its buffered entries
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class _WriteQueue:
+    # the entries of a WriteBehindCache and its writer thread. the thread holds this
+    # object and not the cache, so that a dropped cache can be collected
+    def __init__(self, backend, max_pending):
+        self.backend = backend
+        self.max_pending = max_pending
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        # queued for the next round, and taken by the round being written
+        self.queued = dict()
+        self.writing = dict()
+        self.thread = None
+        self.closed = False
+
+    def get(self, key):
+        with self.condition:
+            entry = self.queued.get(key) or self.writing.get(key)
+        return None if entry is None else entry[1]
+
+    def put_many(self, items):
+        with self.condition:
+            if not self.writer_alive():
+                self.closed = False
+                self.thread = threading.Thread(target=self.run, name="farasa-cache-writer", daemon=True)
+                self.thread.start()
+            for key, text, result in items:
+                if len(self.queued) >= self.max_pending:
+                    self.condition.notify_all()
+                    self.condition.wait_for(lambda: len(self.queued) < self.max_pending)
+                self.queued[key] = (text, result)
+            self.condition.notify_all()
+
+    def writer_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queued or self.closed)
+                if not self.queued:
+                    return
+                self.writing, self.queued = self.queued, dict()
+                self.condition.notify_all()
+            self.write(self.writing)
+            with self.condition:
+                self.writing = dict()
+                self.condition.notify_all()
+
+    def write(self, entries):
+        try:
+            self.backend.set_many((key, text, result) for key, (text, result) in entries.items())
+            self.backend.flush()
+        except Exception as e:
+            logger.warning(f"Failed to save {len(entries)} entries to cache: {e}")
+
+    def flush(self):
+        if os.getpid() != self.pid:
+            return
+        with self.condition:
+            self.condition.wait_for(lambda: not (self.queued or self.writing) or not self.writer_alive())
+            # the writer is gone, at the end of the interpreter for instance
+            entries, self.queued = self.queued, dict()
+        if entries:
+            self.write(entries)
+
+    def discard(self):
+        with self.condition:
+            self.queued.clear()
+            self.condition.wait_for(lambda: not self.writing or not self.writer_alive())
+
+    def stop(self):
+        """Write the queued entries and end the writer thread."""
+        if os.getpid() != self.pid:
+            return
+        if self.thread is not threading.current_thread():
+            self.flush()
+        # else the cache was collected by the writer itself, which writes what is queued before it ends
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+class WriteBehindCache(CacheBackend):
+    """
+    Write the entries of `backend` from a background thread.
+
+    `set` and `set_many` queue the entries and return, lookups see them
+    until they are written. The writer hands everything queued since its last
+    round to the backend in one `set_many` and flushes it. Callers wait only
+    when more than `max_pending` entries are queued. `flush()` waits for the
+    queued entries to be written. They are also written at exit, and when the
+    cache is garbage collected.
+    """
+
+    def __init__(self, backend, max_pending=65536):
+        self.backend = backend
+        self.max_pending = max_pending
+        self._start_queue()
+
+    def _start_queue(self):
+        self._queue = _WriteQueue(self.backend, self.max_pending)
+        # holds the queue only, runs at exit too
+        self._finalizer = weakref.finalize(self, self._queue.stop)
+
+    def get(self, key):
+        result = self._queue.get(key)
+        if result is not None:
+            return result
+        return self.backend.get(key)
+
+    def get_many(self, keys):
+        found = dict()
+        for key in keys:
+            result = self._queue.get(key)
+            if result is not None:
+                found[key] = result
+        if len(found) < len(keys):
+            found.update(self.backend.get_many([key for key in keys if key not in found]))
+        return found
+
+    def set(self, key, text, result):
+        self.set_many([(key, text, result)])
+
+    def set_many(self, items):
+        if os.getpid() != self._queue.pid:
+            # a forked child does not inherit the writer, the entries queued before the fork are its parent's
+            self._finalizer.detach()
+            self._start_queue()
+        self._queue.put_many(items)
+
+    def flush(self):
+        self._queue.flush()
+
+    def items(self):
+        self.flush()
+        return self.backend.items()
+
+    def clear(self):
+        self._queue.discard()
+        self.backend.clear()
+
+    def close(self):
+        self._finalizer()
+        self.backend.close()
+
+    def __len__(self):
+        self.flush()
+        return len(self.backend)
+
+
+class MemoryCache:
+    """
+    A bounded LRU of results kept in the process and keyed by the stripped text.
+
+    It is bounded by `max_entries`, by `max_bytes` (measured with
+    `sys.getsizeof` of the text and the result), or by both.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        assert max_entries is not None or max_bytes is not None, "the memory cache should be bounded"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text):
+        with self.lock:
+            result = self.entries.get(text)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(text)
+            self.hits += 1
+            return result
+
+    def set(self, text, result):
+        entry_size = sys.getsizeof(text) + sys.getsizeof(result)
+        if self.max_bytes is not None and entry_size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(text, None)
+            if previous is not None:
+                self.size -= sys.getsizeof(text) + sys.getsizeof(previous)
+            self.entries[text] = result
+            self.size += entry_size
+            while (self.max_entries is not None and len(self.entries) > self.max_entries) or (
+                self.max_bytes is not None and self.size > self.max_bytes
+            ):
+                old_text, old_result = self.entries.popitem(last=False)
+                self.size -= sys.getsizeof(old_text) + sys.getsizeof(old_result)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
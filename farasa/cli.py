@@ -0,0 +1,261 @@
+"""
+The `farasapy` command, bulk processing from the shell.
+
+    farasapy segment < corpus.txt > segmented.txt
+    farasapy pos --jobs 8 -i corpus/ -o tagged/
+
+Files are processed line by line, one output line per input line. Input
+directories are walked and mirrored into the output directory. With
+`--jobs N`, `N` files are processed at a time by one task object running
+`N` warm interactive JVMs.
+
+Every output is written to `<output>.part` and renamed once complete, so a
+run that is interrupted resumes where it stopped: complete outputs are
+skipped and the lines already in a `.part` file are not processed again.
+"""
+import argparse
+import importlib
+import io
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger("farasapy_logger")
+
+# command name: (module, class, whether it may run interactively)
+TASKS = {
+    "segment": ("farasa.segmenter", "FarasaSegmenter", True),
+    "stem": ("farasa.stemmer", "FarasaStemmer", True),
+    "pos": ("farasa.pos", "FarasaPOSTagger", True),
+    "ner": ("farasa.ner", "FarasaNamedEntityRecognizer", True),
+    "diacritize": ("farasa.diacratizer", "FarasaDiacritizer", True),
+    "lemmatize": ("farasa.lemmatizer", "FarasaLemmatizer", True),
+    "spell-check": ("farasa.spellchecker", "FarasaSpellChecker", False),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="farasapy",
+        description="Run a Farasa task over files, directories or stdin, one output line per input line.",
+    )
+    parser.add_argument("task", choices=sorted(TASKS))
+    parser.add_argument(
+        "-i",
+        "--input",
+        dest="inputs",
+        nargs="+",
+        default=["-"],
+        help="input files or directories, `-` for stdin (the default)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="output file, or directory for several inputs or a directory input. stdout by default",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="files and JVMs processed at a time")
+    parser.add_argument("--glob", default="*", help="files to pick in input directories, such as '*.txt'")
+    parser.add_argument("--batch-size", type=int, default=1000, help="lines sent to the task at a time")
+    parser.add_argument("--standalone", action="store_true", help="start a JVM per batch instead of keeping them warm")
+    parser.add_argument("--overwrite", action="store_true", help="process again the outputs that are complete")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the cache")
+    parser.add_argument("--cache-dir", help="the cache directory, shared with the library by default")
+    parser.add_argument("--cache-backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--bundle", help="a results bundle to look results up in first")
+    parser.add_argument("--binary-path", help="the jar of the task, for the tasks farasapy cannot download")
+    parser.add_argument("--timeout", type=float, help="seconds a batch may take before failing")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not show the progress")
+    parser.add_argument("--log-level", default="ERROR")
+    return parser
+
+
+def create_task(args, parallel_files=False):
+    """
+    Create the task object of `args`, with at most `--jobs` JVMs running at a time.
+
+    Interactive tasks keep `--jobs` warm JVMs. Standalone tasks run the
+    chunks of a batch on `--jobs` JVMs, or one JVM per batch when
+    `parallel_files` already processes `--jobs` files at a time.
+    """
+    module, class_name, interactive = TASKS[args.task]
+    task_class = getattr(importlib.import_module(module), class_name)
+    interactive = interactive and not args.standalone
+    return task_class(
+        interactive=interactive,
+        logging_level=args.log_level,
+        binary_path=args.binary_path,
+        cache=not args.no_cache,
+        cache_dir=args.cache_dir,
+        cache_backend=args.cache_backend,
+        workers=args.jobs if interactive else 1,
+        standalone_jobs=1 if interactive or parallel_files else args.jobs,
+        timeout=args.timeout,
+        bundle=args.bundle,
+    )
+
+
+def plan_outputs(inputs, output, pattern="*"):
+    """
+    Pair every input file with its output path.
+
+    A directory input is walked for the files matching `pattern`, hidden
+    ones left out, and its tree is mirrored in the `output` directory.
+    A single file input goes to `output` itself unless it is a directory.
+    """
+    output = Path(output)
+    plan = list()
+    for name in inputs:
+        path = Path(name)
+        if path.is_dir():
+            for input_path in sorted(path.rglob(pattern)):
+                relative_path = input_path.relative_to(path)
+                if input_path.is_file() and not any(part.startswith(".") for part in relative_path.parts):
+                    plan.append((input_path, output / relative_path))
+        elif path.is_file():
+            single_file = len(inputs) == 1 and not output.is_dir() and not str(output).endswith(("/", os.sep))
+            plan.append((path, output if single_file else output / path.name))
+        else:
+            raise FileNotFoundError(f"no such file or directory: {name}")
+    targets = [target for _, target in plan]
+    duplicates = sorted({str(target) for target in targets if targets.count(target) > 1})
+    if duplicates:
+        raise ValueError(f"several inputs would be written to {', '.join(duplicates)}")
+    return plan
+
+
+def _complete_lines(partial_path):
+    """Count the complete lines of a partial output, cutting a trailing incomplete one."""
+    with open(partial_path, "rb+") as partial:
+        data = partial.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            partial.truncate(complete)
+    return data.count(b"\n", 0, complete)
+
+
+class Progress:
+    """Lines and files done, shown on stderr with the throughput."""
+
+    def __init__(self, files=None, disable=False):
+        from tqdm import tqdm
+
+        self.bar = tqdm(unit=" lines", dynamic_ncols=True, file=sys.stderr, disable=disable)
+        self.files = files
+        self.files_done = 0
+        self.lines = 0
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def update(self, lines):
+        with self.lock:
+            self.lines += lines
+            self.bar.update(lines)
+
+    def file_done(self):
+        with self.lock:
+            self.files_done += 1
+            self.bar.set_postfix_str(f"{self.files_done}/{self.files} files")
+
+    def close(self):
+        self.bar.close()
+        seconds = time.perf_counter() - self.started
+        return self.lines, seconds
+
+
+def process_lines(task, lines, output_file, batch_size, progress):
+    """Write the result of every line, flushing after each batch so that pipes see them."""
+    done = 0
+    for done, result in enumerate(task.iter_task(lines, batch_size=batch_size), 1):
+        output_file.write(result + "\n")
+        if done % batch_size == 0:
+            output_file.flush()
+            progress.update(batch_size)
+    output_file.flush()
+    progress.update(done % batch_size)
+    return done
+
+
+def process_file(task, input_path, output_path, batch_size, progress, overwrite=False):
+    """
+    Process `input_path` into `output_path` through `<output_path>.part`.
+
+    Returns the number of lines processed, None if the output was already complete.
+    """
+    if not overwrite and output_path.is_file() and output_path.stat().st_mtime >= input_path.stat().st_mtime:
+        return None
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = output_path.with_name(output_path.name + ".part")
+    done = _complete_lines(partial_path) if partial_path.is_file() and not overwrite else 0
+    if done:
+        logger.info(f"resuming {input_path} after {done} lines")
+    with open(input_path, "r", encoding="utf-8") as input_file, open(
+        partial_path, "a" if done else "w", encoding="utf-8"
+    ) as output_file:
+        lines = itertools.islice(input_file, done, None)
+        processed = process_lines(task, lines, output_file, batch_size, progress)
+    os.replace(partial_path, output_path)
+    return processed
+
+
+def run(args):
+    assert args.jobs >= 1, "--jobs should be a positive integer"
+    from_stdin = args.inputs == ["-"]
+    plan = None if from_stdin or args.output is None else plan_outputs(args.inputs, args.output, args.glob)
+    task = create_task(args, parallel_files=plan is not None and len(plan) > 1 and args.jobs > 1)
+    progress = Progress(files=None if plan is None else len(plan), disable=args.quiet)
+    failed = list()
+    skipped = 0
+    try:
+        if plan is None:
+            # streamed to stdout: stdin, or the input files one after the other
+            stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", line_buffering=False, write_through=True)
+            # a terminal sends one line at a time, answer each as it comes
+            batch_size = 1 if from_stdin and sys.stdin.isatty() else args.batch_size
+            if from_stdin:
+                stdin = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+                process_lines(task, stdin, stdout, batch_size, progress)
+            else:
+                for name in args.inputs:
+                    with open(name, "r", encoding="utf-8") as input_file:
+                        process_lines(task, input_file, stdout, batch_size, progress)
+                    progress.file_done()
+            stdout.detach()
+        else:
+
+            def process(paths):
+                input_path, output_path = paths
+                try:
+                    return process_file(task, input_path, output_path, args.batch_size, progress, args.overwrite)
+                except Exception as e:
+                    logger.error(f"failed to process {input_path}: {e}")
+                    failed.append(input_path)
+                    return False
+                finally:
+                    progress.file_done()
+
+            with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+                skipped = sum(1 for processed in executor.map(process, plan) if processed is None)
+    finally:
+        lines, seconds = progress.close()
+        task.terminate()
+    if not args.quiet:
+        print(f"{lines} lines in {seconds:.1f}s, {lines / max(seconds, 1e-9):.0f} lines/s", file=sys.stderr)
+        if skipped:
+            print(f"skipped {skipped} complete output(s), pass --overwrite to process them again", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} file(s) failed: {', '.join(map(str, failed))}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Columnar batch results for the POS tagger and the named entity recognizer.
+
+A `TaggedBatch` keeps the tokens of many sentences in a few flat buffers
+instead of one Python object per token: the UTF-8 bytes of all the tokens,
+their byte offsets, their tag ids and the token offsets of the sentences.
+Tag ids come from a `TagVocabulary` that batches can share.
+"""
+import threading
+from array import array
+
+
+class TagVocabulary:
+    """A two way mapping between tags and small integer ids, safe to share between threads."""
+
+    def __init__(self, tags=()):
+        self.tags = list()
+        self.ids = dict()
+        self.lock = threading.Lock()
+        for tag in tags:
+            self.id(tag)
+
+    def id(self, tag):
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            with self.lock:
+                tag_id = self.ids.get(tag)
+                if tag_id is None:
+                    tag_id = len(self.tags)
+                    self.tags.append(tag)
+                    self.ids[tag] = tag_id
+        return tag_id
+
+    def __getitem__(self, tag_id):
+        return self.tags[tag_id]
+
+    def __contains__(self, tag):
+        return tag in self.ids
+
+    def __len__(self):
+        return len(self.tags)
+
+
+# the vocabulary of the batches built without one, so that their ids agree
+tag_vocabulary = TagVocabulary()
+
+
+class TaggedBatch:
+    """
+    The `(token, tag)` pairs of a list of sentences, stored column by column.
+
+    - `data`: the UTF-8 bytes of all the tokens, one after the other.
+    - `token_offsets`: token `i` is `data[token_offsets[i]:token_offsets[i + 1]]`.
+    - `tag_ids`: the id of the tag of every token in `vocabulary`.
+    - `sentence_offsets`: sentence `j` holds tokens
+      `sentence_offsets[j]` to `sentence_offsets[j + 1]`.
+
+    Slicing with `sentences()` or `tokens_between()` returns batches that share
+    the buffers of this one, nothing is copied or parsed again.
+    """
+
+    def __init__(self, data, token_offsets, tag_ids, sentence_offsets, vocabulary):
+        self.data = data
+        self.token_offsets = token_offsets
+        self.tag_ids = tag_ids
+        self.sentence_offsets = sentence_offsets
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def from_sentences(cls, sentences, vocabulary=None):
+        """Build a batch from an iterable of sentences, each an iterable of `(token, tag)` pairs."""
+        vocabulary = tag_vocabulary if vocabulary is None else vocabulary
+        data = bytearray()
+        token_offsets = array("Q", [0])
+        tag_ids = array("I")
+        sentence_offsets = array("I", [0])
+        # local names keep the attribute lookups out of the loop
+        tag_id, add_offset, add_tag_id = vocabulary.id, token_offsets.append, tag_ids.append
+        for sentence in sentences:
+            for token, tag in sentence:
+                data += token.encode("utf-8")
+                add_offset(len(data))
+                add_tag_id(tag_id(tag))
+            sentence_offsets.append(len(tag_ids))
+        return cls(bytes(data), token_offsets, tag_ids, sentence_offsets, vocabulary)
+
+    def __len__(self):
+        return len(self.tag_ids)
+
+    @property
+    def num_sentences(self):
+        return len(self.sentence_offsets) - 1
+
+    @property
+    def nbytes(self):
+        """The size of the buffers, shared buffers included."""
+        return (
+            len(self.data)
+            + len(self.token_offsets) * self.token_offsets.itemsize
+            + len(self.tag_ids) * self.tag_ids.itemsize
+            + len(self.sentence_offsets) * self.sentence_offsets.itemsize
+        )
+
+    def token(self, index):
+        return bytes(self.data[self.token_offsets[index] : self.token_offsets[index + 1]]).decode("utf-8")
+
+    def tag(self, index):
+        return self.vocabulary[self.tag_ids[index]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return self.token(index), self.tag(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.token(index), self.tag(index)
+
+    def sentence(self, index):
+        """The `(token, tag)` pairs of sentence `index`."""
+        start, stop = self.sentence_offsets[index], self.sentence_offsets[index + 1]
+        return [(self.token(i), self.tag(i)) for i in range(start, stop)]
+
+    def iter_sentences(self):
+        for index in range(self.num_sentences):
+            yield self.sentence(index)
+
+    def tokens_between(self, start, stop):
+        """A batch of the tokens `start` to `stop`, as a single sentence."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        return TaggedBatch(
+            self.data,
+            memoryview(self.token_offsets)[start : stop + 1],
+            memoryview(self.tag_ids)[start:stop],
+            array("I", [0, stop - start]),
+            self.vocabulary,
+        )
+
+    def sentences(self, start, stop):
+        """A batch of the sentences `start` to `stop`."""
+        start, stop, _ = slice(start, stop).indices(self.num_sentences)
+        stop = max(start, stop)
+        first, last = self.sentence_offsets[start], self.sentence_offsets[stop]
+        return TaggedBatch(
+            self.data,
+            memoryview(self.token_offsets)[first : last + 1],
+            memoryview(self.tag_ids)[first:last],
+            array("I", (offset - first for offset in self.sentence_offsets[start : stop + 1])),
+            self.vocabulary,
+        )
+
+    def to_numpy(self):
+        """
+        The columns as NumPy arrays, without copying them.
+
+        NumPy is an optional dependency, install it with `pip install farasapy[numpy]`.
+        """
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("to_numpy needs numpy, install it with `pip install farasapy[numpy]`") from e
+        return {
+            "data": np.frombuffer(self.data, dtype=np.uint8),
+            "token_offsets": np.frombuffer(self.token_offsets, dtype=np.uint64),
+            "tag_ids": np.frombuffer(self.tag_ids, dtype=np.uint32),
+            "sentence_offsets": np.frombuffer(self.sentence_offsets, dtype=np.uint32),
+            "tags": np.array(self.vocabulary.tags, dtype=object),
+        }
+
@@ -12,3 +12,21 @@ class FarasaDiacritizer(FarasaBase):
 
     def diacritize(self, text):
         return self.do_task(text=text)
+
+    def diacritize_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_diacritize(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def diacritize_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def adiacritize(self, text):
+        return await self.ado_task(text=text)
+
+    async def adiacritize_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_diacritize(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
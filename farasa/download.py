@@ -0,0 +1,185 @@
+"""
+Download and extraction of the toolkit binaries.
+
+`requests`, `tqdm` and `zipfile` are imported by the functions that use them,
+they are needed once per install while this module is imported by every task.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger("farasapy_logger")
+
+# change download url from github releases to qcri
+# BINARIES_URL = "https://github.com/MagedSaeed/farasapy/releases/download/toolkit-bins-released/farasa_bin.zip"
+BINARIES_URL = "https://farasa-api.qcri.org/farasapy/releases/download/toolkit-bins-released/farasa_bin.zip"
+# a mirror, a file:// URL or a local path of the archive, for offline installs
+BINARIES_URL_ENV = "FARASAPY_BINARIES_URL"
+# the sha256 hex digest of the archive at BINARIES_URL, checked by default installs once
+# it is set. no digest is pinned for the current release yet
+BINARIES_SHA256 = None
+# the expected sha256 hex digest of the archive, for mirrors and other releases
+BINARIES_SHA256_ENV = "FARASAPY_BINARIES_SHA256"
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+def local_path(url):
+    """Return the local path of `url` if it is a plain path or a file:// URL, else None"""
+    parsed = urlparse(str(url))
+    if parsed.scheme == "file":
+        from urllib.request import url2pathname
+
+        return Path(url2pathname(unquote(parsed.path)))
+    if parsed.scheme in ("http", "https"):
+        return None
+    # plain paths, Windows drive letters included
+    return Path(url)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_sha256(path, expected_sha256):
+    if expected_sha256 is None:
+        return
+    actual_sha256 = file_sha256(path)
+    if actual_sha256.lower() != expected_sha256.lower():
+        raise DownloadError(
+            f"checksum mismatch for {path}: expected {expected_sha256}, got {actual_sha256}"
+        )
+
+
+def download_file(url, destination, expected_sha256=None, verify_tls=True, progress=True):
+    """
+    Stream `url` to `destination`, resuming a previous partial download.
+
+    Data goes to `<destination>.part` first. If that file exists, only the
+    missing bytes are requested with an HTTP range request. The file is
+    renamed to `destination` once complete and, when `expected_sha256` is
+    given, verified. A corrupted partial file is removed so the next try
+    starts over.
+    """
+    import requests
+    from tqdm import tqdm
+
+    destination = Path(destination)
+    partial = destination.with_name(destination.name + ".part")
+    offset = partial.stat().st_size if partial.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else dict()
+    with requests.get(url, stream=True, headers=headers, verify=verify_tls, timeout=60) as response:
+        if response.status_code == 416:
+            # nothing left to send when the partial file holds the whole archive
+            if response.headers.get("content-range") != f"bytes */{offset}":
+                partial.unlink()
+                raise DownloadError(f"the partial download {partial} does not match {url}, try again")
+        else:
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                logger.info("the server does not support resuming, downloading from the start..")
+                offset = 0
+            total = int(response.headers.get("content-length", 0)) + offset
+            bar = tqdm(
+                total=total,
+                initial=offset,
+                unit="iB",
+                unit_scale=True,
+                dynamic_ncols=True,
+                file=sys.stdout,
+                disable=not progress,
+            )
+            with open(partial, "ab" if offset else "wb") as f:
+                for data in response.iter_content(CHUNK_SIZE):
+                    f.write(data)
+                    bar.update(len(data))
+            bar.close()
+    try:
+        verify_sha256(partial, expected_sha256)
+    except DownloadError:
+        partial.unlink()
+        raise
+    os.replace(partial, destination)
+    return destination
+
+
+def _remove(path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def extract_archive(archive_path, target_dir):
+    """
+    Extract a zip archive into `target_dir` without leaving a half extracted tree.
+
+    Members are extracted into a temporary directory next to their target.
+    Each top level entry then replaces the existing one with a rename.
+    """
+    import zipfile
+
+    target_dir = Path(target_dir)
+    staging_dir = Path(tempfile.mkdtemp(prefix=".farasa-extract-", dir=target_dir))
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            archive.extractall(path=staging_dir)
+        for entry in staging_dir.iterdir():
+            destination = target_dir / entry.name
+            backup = None
+            if destination.exists():
+                backup = target_dir / f".{entry.name}.old"
+                if backup.exists():
+                    _remove(backup)
+                os.replace(destination, backup)
+            os.replace(entry, destination)
+            if backup is not None:
+                _remove(backup)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def download_binaries(target_dir, url=None, expected_sha256=None):
+    """
+    Fetch the toolkit binaries archive and extract it into `target_dir`.
+
+    `url` defaults to the `FARASAPY_BINARIES_URL` environment variable, then
+    to the QCRI release. It may be a local path or a file:// URL. The
+    checksum defaults to `FARASAPY_BINARIES_SHA256`, then to
+    `BINARIES_SHA256` for the QCRI release when a digest is pinned there. A
+    mirror sets `FARASAPY_BINARIES_SHA256`, or passes `expected_sha256`, with
+    the digest of its own archive.
+    """
+    url = url or os.getenv(BINARIES_URL_ENV) or BINARIES_URL
+    official = url == BINARIES_URL
+    expected_sha256 = expected_sha256 or os.getenv(BINARIES_SHA256_ENV) or (BINARIES_SHA256 if official else None)
+    if expected_sha256 is None:
+        logger.warning(f"no sha256 digest is known for {url}, the binaries are not verified")
+    target_dir = Path(target_dir)
+    archive_path = local_path(url)
+    downloaded = archive_path is None
+    if downloaded:
+        archive_path = target_dir / "farasa_bin.zip"
+        logger.info(f"downloading zipped binaries from {url}...")
+        # the qcri server certificate does not verify on every platform
+        download_file(url, archive_path, expected_sha256, verify_tls=not official)
+    else:
+        logger.info(f"using the local binaries archive at {archive_path}")
+        verify_sha256(archive_path, expected_sha256)
+    logger.debug("extracting...")
+    extract_archive(archive_path, target_dir)
+    if downloaded:
+        archive_path.unlink()
+    logger.debug("toolkit binaries are downloaded and extracted.")
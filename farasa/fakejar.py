@@ -0,0 +1,100 @@
+"""
+A stand-in for the Farasa jars, for benchmarks and tests without java.
+
+It speaks the same protocol as the jars: with `-i <input> -o <output>` it
+processes a file, otherwise it answers every line of stdin with one line on
+stdout. The output imitates the shape of the output of each task, and the
+delays imitate the start of a JVM and the cost of a line:
+
+    python farasa/fakejar.py --task POS --startup 0.5 --per-line 0.0001
+
+The file imports nothing from farasa so that it runs fast by its path.
+"""
+import argparse
+import sys
+import time
+
+
+def _segment(word):
+    if word.startswith("ال") and len(word) > 2:
+        return f"ال+{word[2:]}"
+    return word
+
+
+def _stem(word):
+    if word.startswith("ال") and len(word) > 2:
+        return word[2:]
+    return word
+
+
+def _tag(word):
+    if word.startswith("ال") and len(word) > 2:
+        return f"ال+ {word[2:]}/DET+NOUN-MS"
+    return f"{word}/NOUN-MS"
+
+
+TASKS = {
+    "segment": lambda words: " ".join(map(_segment, words)),
+    "stem": lambda words: " ".join(map(_stem, words)),
+    "POS": lambda words: " ".join(["S/S", *map(_tag, words), "E/E"]),
+    "NER": lambda words: " ".join(f"{word}/O" for word in words),
+    "diacritize": lambda words: " ".join(words),
+    "lemmatize": lambda words: " ".join(map(_stem, words)),
+    "spell_check": lambda words: " ".join(words),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="a fake Farasa jar")
+    parser.add_argument("--task", default="segment", choices=sorted(TASKS))
+    parser.add_argument("--startup", type=float, default=0.0, help="seconds to sleep before the first line")
+    parser.add_argument("--per-line", type=float, default=0.0, help="seconds to sleep for every line")
+    parser.add_argument("--per-char", type=float, default=0.0, help="seconds to sleep for every character")
+    parser.add_argument("--hang-after", type=int, default=None, help="stop answering after this many lines")
+    parser.add_argument("--stderr-per-line", type=int, default=0, help="bytes written to stderr for every line")
+    parser.add_argument("-version", action="store_true", help="print a java version, as `java -version` does")
+    parser.add_argument("-i", dest="input_path")
+    parser.add_argument("-o", dest="output_path")
+    # the options the real jars take, such as `-l true` of the stemmer
+    args, _ = parser.parse_known_args(argv)
+    if args.version:
+        sys.stderr.write('openjdk version "17.0.2" 2022-01-18\n')
+        return
+    process = TASKS[args.task]
+
+    answered = 0
+
+    def answer(line):
+        nonlocal answered
+        if args.hang_after is not None and answered >= args.hang_after:
+            # a stuck JVM, alive but silent
+            while True:
+                time.sleep(60)
+        answered += 1
+        if args.stderr_per_line:
+            sys.stderr.write("w" * (args.stderr_per_line - 1) + "\n")
+            sys.stderr.flush()
+        line = line.strip()
+        delay = args.per_line + args.per_char * len(line)
+        if delay:
+            time.sleep(delay)
+        return process(line.split()) if line else ""
+
+    if args.startup:
+        time.sleep(args.startup)
+    if args.input_path:
+        with open(args.input_path, "r", encoding="utf-8") as input_file, open(
+            args.output_path, "w", encoding="utf-8"
+        ) as output_file:
+            for line in input_file:
+                output_file.write(answer(line) + "\n")
+        return
+    stdin = open(sys.stdin.fileno(), "r", encoding="utf-8", closefd=False)
+    stdout = open(sys.stdout.fileno(), "w", encoding="utf-8", closefd=False)
+    for line in stdin:
+        stdout.write(answer(line) + "\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,8 @@ class FarasaLemmatizer(FarasaBase):
     task = "lemmatize"
     is_downloadable = False
 
-    def __init__(self, interactive=False, logging_level="WARNING", binary_path=None):
-        super().__init__(interactive, logging_level, binary_path)
+    def __init__(self, interactive=False, logging_level="WARNING", binary_path=None, **kwargs):
+        super().__init__(interactive, logging_level, binary_path, **kwargs)
 
     @property
     def command(self):
@@ -15,4 +15,22 @@ class FarasaLemmatizer(FarasaBase):
         raise Exception("Binary path for lemmatizer is not provided.")
 
     def lemmatize(self, text):
-        return self.do_task(text=text) 
\ No newline at end of file
+        return self.do_task(text=text)
+
+    def lemmatize_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_lemmatize(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def lemmatize_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def alemmatize(self, text):
+        return await self.ado_task(text=text)
+
+    async def alemmatize_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_lemmatize(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
@@ -0,0 +1,250 @@
+"""
+Counters, latency histograms and tracing hooks of the task objects.
+
+Every task object reports to a `Metrics` registry, the shared `metrics` one
+unless it is given another. Series are labelled with the task and the mode:
+
+- `jvm_spawns_total`, `pipe_restarts_total`: processes started by farasapy.
+- `worker_recycles_total`, `timeouts_total`: workers replaced after reaching
+  a limit, calls that got no answer within the timeout.
+- `bytes_written_total`, `bytes_read_total`: text sent to and read from them.
+- `cache_hits_total`, `cache_misses_total`: lookups, labelled with the tier.
+- `server_requests_total`, `server_batches_total`, `server_texts_total`:
+  requests to `farasa.server` and the batches they were merged into.
+- `do_task_seconds`, `do_task_many_seconds`: a whole call, the Python side
+  included. Calls answered by the memory cache are left out of `do_task`.
+- `run_task_standalone_seconds`, `run_task_interactive_seconds`: the time
+  spent waiting for the jar, the JVM side of a call.
+- `<span>_errors_total`: calls that raised.
+
+`to_prometheus()` renders them in the Prometheus text format.
+"""
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger("farasapy_logger")
+
+# in seconds, from a cache hit to a diacritizer start
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+
+def label_pairs(labels):
+    """Turn a dict of labels into the sorted tuple used as a series key."""
+    if labels.__class__ is tuple:
+        return labels
+    return tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Observations counted in cumulative buckets, as Prometheus expects them."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "started", "contexts")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.contexts = ()
+
+    def __enter__(self):
+        if self.metrics.span_hooks:
+            labels = dict(self.labels)
+            self.contexts = [hook(self.name, labels) for hook in self.metrics.span_hooks]
+            for context in self.contexts:
+                context.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        metrics = self.metrics
+        metrics.observe(self.name + "_seconds", seconds, self.labels)
+        if exc_type is not None:
+            metrics.inc(self.name + "_errors_total", self.labels)
+        for context in reversed(self.contexts):
+            context.__exit__(exc_type, exc, traceback)
+        for callback in metrics.callbacks:
+            try:
+                callback(self.name, dict(self.labels), seconds, exc)
+            except Exception as e:
+                logger.warning(f"a metrics callback failed: {e}")
+        return False
+
+
+class Metrics:
+    """A thread safe registry of counters and histograms, keyed by name and labels."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = dict()
+        self.histograms = dict()
+        self.callbacks = list()
+        self.span_hooks = list()
+        self.collectors = list()
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, label_pairs(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, label_pairs(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.counts[bisect.bisect_left(histogram.buckets, value)] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def span(self, name, labels=()):
+        """
+        Time the block into the `<name>_seconds` histogram.
+
+        Span hooks are entered around the block and callbacks are called
+        after it, as `callback(name, labels, seconds, error)`.
+        """
+        return _Span(self, name, label_pairs(labels))
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+    def add_span_hook(self, hook):
+        """
+        Wrap every span in `hook(name, labels)`, a context manager factory.
+
+        For example, with OpenTelemetry:
+        `metrics.add_span_hook(lambda name, labels: tracer.start_as_current_span(name, attributes=labels))`
+        """
+        self.span_hooks.append(hook)
+
+    def remove_span_hook(self, hook):
+        self.span_hooks.remove(hook)
+
+    def add_collector(self, collector):
+        """
+        Report counters kept elsewhere, read when the metrics are scraped.
+
+        `collector()` returns `(name, labels, value)` tuples, added to the
+        counters of the registry, or None to be removed. It is called with
+        the registry locked and should only read its own counters.
+        """
+        with self.lock:
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        """
+        Stop reading `collector`, keeping its last values in the counters.
+
+        Counters never go down, so the counts of an object that goes away
+        stay in the totals of the registry.
+        """
+        with self.lock:
+            if collector not in self.collectors:
+                return
+            self.collectors.remove(collector)
+            for name, labels, value in collector() or ():
+                key = (name, label_pairs(labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def _collect_counters(self):
+        with self.lock:
+            counters = dict(self.counters)
+            for collector in list(self.collectors):
+                collected = collector()
+                if collected is None:
+                    self.collectors.remove(collector)
+                    continue
+                for name, labels, value in collected:
+                    key = (name, label_pairs(labels))
+                    counters[key] = counters.get(key, 0) + value
+        return counters
+
+    def counter(self, name, **labels):
+        return self._collect_counters().get((name, label_pairs(labels)), 0)
+
+    def snapshot(self):
+        """
+        Every series as a dict keyed like `name{label="value"}`.
+
+        Counters map to their value, histograms to their count and sum.
+        """
+        snapshot = {
+            f"{name}{_format_labels(labels)}": value for (name, labels), value in self._collect_counters().items()
+        }
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                snapshot[f"{name}{_format_labels(labels)}"] = {"count": histogram.count, "sum": histogram.sum}
+        return snapshot
+
+    def reset(self):
+        """Clear the counters and histograms, collected counters are kept by their owners."""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self, prefix="farasapy"):
+        """Render every series in the Prometheus text exposition format."""
+        counters = sorted(self._collect_counters().items())
+        with self.lock:
+            histograms = sorted(
+                (key, (histogram.buckets, list(histogram.cumulative_counts()), histogram.sum, histogram.count))
+                for key, histogram in self.histograms.items()
+            )
+        lines = list()
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            metric = f"{prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, cumulative in zip((*buckets, "+Inf"), counts):
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+# the registry of the task objects created without one
+metrics = Metrics()
@@ -1,4 +1,14 @@
 from .__base import FarasaBase
+from .columnar import TaggedBatch
+
+
+def iter_recognized_pairs(recognized_text):
+    """Parse the output of the named entity recognizer into `(token, tag)` pairs."""
+    for tagged_token in recognized_text.split():
+        token, slash, tag = tagged_token.rpartition("/")
+        if not slash:
+            token, tag = tag, ""
+        yield token, tag
 
 
 class FarasaNamedEntityRecognizer(FarasaBase):
@@ -12,3 +22,36 @@ class FarasaNamedEntityRecognizer(FarasaBase):
 
     def recognize(self, text):
         return self.do_task(text=text)
+
+    def recognize_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_recognize(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def recognize_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def arecognize(self, text):
+        return await self.ado_task(text=text)
+
+    async def arecognize_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_recognize(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
+
+    def recognize_columnar(self, texts, vocabulary=None, batch_size=1000):
+        """
+        Recognize the entities of `texts` into a `TaggedBatch`, one sentence per text.
+
+        Texts are processed `batch_size` at a time and only the columns are
+        kept, which makes it fit for millions of sentences.
+        """
+        return TaggedBatch.from_sentences(
+            (
+                iter_recognized_pairs(recognized_text)
+                for recognized_text in self.iter_recognize(texts, batch_size=batch_size)
+            ),
+            vocabulary,
+        )
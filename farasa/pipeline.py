@@ -0,0 +1,108 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, task, error):
+        self.task = task
+        self.error = error
+
+
+class FarasaPipeline:
+    """
+    Run several task objects over the same documents at the same time.
+
+    The stages form a chain connected by bounded queues. Each stage runs in
+    its own thread and adds its result to the document before passing it on.
+    While one stage works on a document, the stage before it is already
+    working on the next one. Interactive task objects work best, as their
+    JVMs stay warm between documents.
+    """
+
+    def __init__(self, *tasks, queue_size=64):
+        assert tasks, "a pipeline needs at least one task"
+        names = [task.task for task in tasks]
+        assert len(set(names)) == len(names), f"every task should appear once, got {names}"
+        self.tasks = tasks
+        self.queue_size = queue_size
+
+    def _put(self, target_queue, item, stop):
+        while not stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, texts, target_queue, stop):
+        try:
+            for index, text in enumerate(texts):
+                if not self._put(target_queue, (index, text, dict()), stop):
+                    return
+        except Exception as error:
+            self._put(target_queue, _StageError(None, error), stop)
+            return
+        self._put(target_queue, _DONE, stop)
+
+    def _run_stage(self, task, source_queue, target_queue, stop):
+        while not stop.is_set():
+            try:
+                item = source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is not _DONE and not isinstance(item, _StageError):
+                index, text, results = item
+                try:
+                    results[task.task] = task.do_task(text)
+                except Exception as error:
+                    item = _StageError(task, error)
+            if not self._put(target_queue, item, stop) or item is _DONE or isinstance(item, _StageError):
+                return
+
+    def run(self, texts):
+        """
+        Yield one `{task name: result}` dict per text, in the input order.
+
+        `texts` may be any iterable, it is consumed as the stages make room.
+        """
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.tasks) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(texts, queues[0], stop), daemon=True)]
+        for position, task in enumerate(self.tasks):
+            threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(task, queues[position], queues[position + 1], stop),
+                    name=f"farasa-pipeline-{task.task}",
+                    daemon=True,
+                )
+            )
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _StageError):
+                    raise item.error
+                yield item[2]
+        finally:
+            # lets the stages exit when the consumer stops early or a stage failed
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def process_many(self, texts):
+        return list(self.run(texts))
+
+    def process(self, text):
+        return self.process_many([text])[0]
+
+    def terminate(self):
+        for task in self.tasks:
+            if task.interactive:
+                task.terminate()
@@ -1,54 +1,57 @@
+from itertools import islice
+from sys import intern
+
 from .__base import FarasaBase
+from .columnar import TaggedBatch
+
+# the parsed form of every tag seen so far, tags come from a small closed set
+_parsed_tags = dict()
+
+
+def _parse_tag(tag):
+    parsed = _parsed_tags.get(tag)
+    if parsed is None:
+        subtags = tag.split("-")
+        parsed = (subtags[0], *(tuple(subtag) for subtag in subtags[1:]))
+        _parsed_tags[tag] = parsed
+    return parsed
 
 
 class TaggedToken:
+    __slots__ = ("tokens", "tags", "_tuple")
+
     def __init__(self, token, tag):
-        self.tokens, self.tags = list(), list()
-        self.tokens.append(token)
-        self.tags.append(tag)
+        self.tokens = (token,)
+        self.tags = (intern(tag),)
+        self._tuple = None
 
     def append_connected_token(self, token=None, tag=None, tagged_token=None):
         assert not (token and tag) or not tagged_token
         if tagged_token:
-            self.tokens.extend(tagged_token.tokens)
-            self.tags.extend(tagged_token.tags)
+            self.tokens += tagged_token.tokens
+            self.tags += tagged_token.tags
 
         else:
-            self.tokens.append(token)
-            self.tags.append(tag)
+            self.tokens += (token,)
+            self.tags += (intern(tag),)
+        self._tuple = None
 
     @property
     def last_token(self):
         return self.tokens[-1]
 
-    # def raise_value_error(self):
-    #     raise ValueError("Tagged Token object cannot have more than three subtokens")
-
-    def _process_tag(self, tag):
-        subtags = tag.split("-")
-        if len(subtags) == 1:
-            return subtags
-        else:
-            return (subtags[0], *list(subtags[1]))
-
     def process_tags(self):
-        processed_tags = list()
-        for tag in self.tags:
-            processed_subtags = list()
-            subtags = tag.split("-")
-            processed_subtags.append(subtags[0])
-            if len(subtags) > 1:
-                for subtag in subtags[1:]:
-                    processed_subtags.append(tuple(subtag))
-            processed_tags.append(processed_subtags)
-        return tuple(processed_tags)
+        return tuple(list(_parse_tag(tag)) for tag in self.tags)
 
     def as_tuple(self):
-        return (
-            "".join(token.strip() for token in self.tokens).replace("+", ""),
-            # *list(self._process_tag(tag) for tag in self.tags),
-            self.process_tags(),
-        )
+        # built once, the tuple is shared between calls
+        if self._tuple is None:
+            if len(self.tokens) == 1:
+                text = self.tokens[0].strip().replace("+", "")
+            else:
+                text = "".join(token.strip() for token in self.tokens).replace("+", "")
+            self._tuple = (text, self.process_tags())
+        return self._tuple
 
     def __str__(self):
         return str(self.as_tuple())
@@ -57,6 +60,54 @@ class TaggedToken:
         return str(self.as_tuple())
 
 
+def iter_tagged_words(tagged_text):
+    """
+    Parse the output of the POS tagger into `(tokens, tags)` tuples, one per word.
+
+    The first and last tokens, the S/S and E/E markers around the text, are
+    skipped. Tokens without a slash are the leading parts of a segmented word
+    whose tags all come with its last part, e.g. `ال+ لغ +ة/DET+NOUN+NSUFF-FS`.
+    """
+    subtokens = list()
+    tagged_tokens = tagged_text.split()
+    # an empty text has no markers, and islice rejects a negative stop
+    for tagged_token in islice(tagged_tokens, 1, max(1, len(tagged_tokens) - 1)):
+        # everything after the last slash is the tag, dates like 19/5/1955 included
+        token, slash, tag = tagged_token.rpartition("/")
+        if not slash:
+            subtokens.append(tagged_token)
+        elif subtokens and "/" not in token:
+            subtokens.append(token)
+            tags = tag.split("+")
+            assert len(subtokens) == len(tags)
+            yield subtokens, tags
+            subtokens = list()
+        else:
+            yield (token,), (tag,)
+
+
+def iter_tagged_tokens(tagged_text, combine_subtokens=False):
+    """Parse the output of the POS tagger into `TaggedToken` objects, lazily."""
+    for tokens, tags in iter_tagged_words(tagged_text):
+        if len(tokens) == 1:
+            yield TaggedToken(tokens[0], tags[0])
+        elif combine_subtokens:
+            tokens_object = TaggedToken(tokens[0], tags[0])
+            for _token, _tag in zip(tokens[1:], tags[1:]):
+                tokens_object.append_connected_token(token=_token, tag=_tag)
+            yield tokens_object
+        else:
+            for _token, _tag in zip(tokens, tags):
+                yield TaggedToken(_token, _tag)
+
+
+def iter_tagged_pairs(tagged_text):
+    """Parse the output of the POS tagger into `(token, tag)` pairs, one per segment."""
+    for tokens, tags in iter_tagged_words(tagged_text):
+        for token, tag in zip(tokens, tags):
+            yield token.strip().replace("+", ""), tag
+
+
 class FarasaPOSTagger(FarasaBase):
 
     @property
@@ -66,50 +117,55 @@ class FarasaPOSTagger(FarasaBase):
         return self.BASE_CMD + [str(self.bin_dir / "FarasaPOSJar.jar")]
 
     task = "POS"
+    # every tagged line is wrapped in S/S ... E/E, cutting lines would add markers
+    sentence_chunking = False
 
     def tag(self, text):
         return self.do_task(text=text)
 
+    def tag_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_tag(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def tag_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def atag(self, text):
+        return await self.ado_task(text=text)
+
+    async def atag_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_tag(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
+
+    def tag_columnar(self, texts, vocabulary=None, batch_size=1000):
+        """
+        Tag `texts` into a `TaggedBatch`, one sentence per text.
+
+        Texts are tagged `batch_size` at a time and only the columns are kept,
+        which makes it fit for millions of sentences.
+        """
+        return TaggedBatch.from_sentences(
+            (iter_tagged_pairs(tagged_text) for tagged_text in self.iter_tag(texts, batch_size=batch_size)),
+            vocabulary,
+        )
+
     def tag_segments(self, text, combine_subtokens=False):
-        tokens_objects = list()
-        tagged_text = self.tag(text)
-        # ignore the first and last as they are indications of
-        #  the begining and end of the string
-        tagged_tokens = tagged_text.split()[1:-1]
-        subtokens = list()
-        for tagged_token in tagged_tokens:
-            slash_count = self._count_slashes(tagged_token)
-            # if there is no slash, then this must have been a subtoken
-            if slash_count == 0:
-                subtokens.append(tagged_token)
-            # check if the token has multiple slashes ex: date 19/5/1955 or a single slash
-            elif slash_count > 1:
-                token = "/".join(tagged_token.split("/")[0:-1])
-                tag = tagged_token.split("/")[-1]
-                tokens_objects.append(TaggedToken(token, tag))
-            else:
-                temp_token, temp_tag = tagged_token.split("/")
-                if len(subtokens) > 0:
-                    subtokens.append(temp_token)
-                    temp_tags = temp_tag.split("+")
-                    assert len(subtokens) == len(temp_tags)
-                    if combine_subtokens:
-                        tokens_object = TaggedToken(subtokens[0], temp_tags[0])
-                        for _token, _tag in zip(subtokens[1:], temp_tags[1:]):
-                            tokens_object.append_connected_token(token=_token, tag=_tag)
-                        tokens_objects.append(tokens_object)
-                    else:
-                        for _token, _tag in zip(subtokens, temp_tags):
-                            tokens_objects.append(TaggedToken(_token, _tag))
-                    subtokens = list()
-                else:
-                    tokens_objects.append(TaggedToken(temp_token, temp_tag))
-        return tokens_objects
-
-    def _count_slashes(self, text: str):
-        # this is the faster counter implementation for very short text
-        slash_counter = 0
-        for c in text:
-            if c == "/":
-                slash_counter += 1
-        return slash_counter
+        return list(self.iter_tag_segments(text, combine_subtokens=combine_subtokens))
+
+    def iter_tag_segments(self, text, combine_subtokens=False, batch_size=1000):
+        """
+        Yield the `TaggedToken` objects of `text` as they are parsed.
+
+        `text` may also be an iterable of lines, such as an open file. The
+        lines are then tagged `batch_size` at a time and the tokens of each
+        line follow the tokens of the line before it.
+        """
+        if isinstance(text, str):
+            yield from iter_tagged_tokens(self.tag(text), combine_subtokens)
+            return
+        for tagged_line in self.iter_tag(text, batch_size=batch_size):
+            yield from iter_tagged_tokens(tagged_line, combine_subtokens)
@@ -1,8 +1,60 @@
+from functools import partial
+from itertools import islice
+
 from .__base import FarasaBase
 
 
+def desegment_word(word: str) -> str:
+    desegmented_word = word.replace("ل+ال+", "لل")
+    if "ال+ال" not in word:
+        desegmented_word = desegmented_word.replace("ل+ال", "لل")
+    desegmented_word = desegmented_word.replace("+", "")
+    desegmented_word = desegmented_word.replace("للل", "لل")
+    return desegmented_word
+
+
+def desegment_text(text, separator=" "):
+    """
+    Desegment every word of `text`, the words are joined with spaces.
+
+    No rule of `desegment_word` matches across a space, so the rules are run
+    once over the whole text rather than once per word. Only a text holding
+    "ال+ال", where the second rule depends on the word, goes word by word.
+    """
+    if not separator:
+        raise ValueError("empty separator")
+    joined = text if separator == " " else text.replace(separator, " ")
+    if "ال+ال" in joined:
+        return " ".join(map(desegment_word, text.split(separator)))
+    return joined.replace("ل+ال+", "لل").replace("ل+ال", "لل").replace("+", "").replace("للل", "لل")
+
+
+def iter_desegment(lines, separator=" ", jobs=1, batch_size=10000):
+    """
+    Yield the desegmented form of every item of `lines`, in order.
+
+    With `jobs` above 1, items are read `batch_size` at a time and spread
+    over a pool of `jobs` processes. A trailing newline of an item is kept.
+    """
+    desegment = partial(desegment_text, separator=separator)
+    if jobs == 1:
+        yield from map(desegment, lines)
+        return
+    # multiprocessing is imported only when processes are asked for
+    from concurrent.futures import ProcessPoolExecutor
+
+    lines = iter(lines)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                return
+            yield from executor.map(desegment, batch, chunksize=max(1, len(batch) // (jobs * 4)))
+
+
 class FarasaSegmenter(FarasaBase):
     task = "segment"
+    word_level = True
 
     @property
     def command(self):
@@ -13,13 +65,39 @@ class FarasaSegmenter(FarasaBase):
     def segment(self, text):
         return self.do_task(text=text)
 
-    def _desegment_word(self, word: str) -> str:
-        desegmented_word = word.replace("ل+ال+", "لل")
-        if "ال+ال" not in word:
-            desegmented_word = desegmented_word.replace("ل+ال", "لل")
-        desegmented_word = desegmented_word.replace("+", "")
-        desegmented_word = desegmented_word.replace("للل", "لل")
-        return desegmented_word
+    def segment_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_segment(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def segment_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def asegment(self, text):
+        return await self.ado_task(text=text)
+
+    async def asegment_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_segment(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
+
+    _desegment_word = staticmethod(desegment_word)
 
     def desegment(self, text, separator=" "):
-        return " ".join(self._desegment_word(word) for word in text.split(separator))
+        return desegment_text(text, separator=separator)
+
+    def desegment_many(self, texts, separator=" ", jobs=1):
+        return list(iter_desegment(texts, separator=separator, jobs=jobs))
+
+    def iter_desegment(self, lines, separator=" ", jobs=1, batch_size=10000):
+        return iter_desegment(lines, separator=separator, jobs=jobs, batch_size=batch_size)
+
+    def desegment_file(self, input_path, output_path, separator=" ", jobs=1, batch_size=10000):
+        with open(input_path, "r", encoding="utf-8") as input_file, open(
+            output_path, "w", encoding="utf-8"
+        ) as output_file:
+            output_file.writelines(
+                iter_desegment(input_file, separator=separator, jobs=jobs, batch_size=batch_size)
+            )
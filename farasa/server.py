@@ -0,0 +1,414 @@
+"""
+A local server sharing warm task processes between many clients.
+
+    python -m farasa.server --task segment --task pos --workers 2 --port 8000
+
+Each task object of the server keeps its JVMs warm. Requests that arrive
+within `batch_window` seconds of each other are merged into one
+`do_task_many` call, so many small requests cost one trip through the
+cache and the JVMs instead of one each. `FarasaClient` talks to the server
+with the methods of the task classes:
+
+    client = FarasaClient("http://127.0.0.1:8000")
+    client.segment("...")
+    client.tag_many([...])
+
+The protocol is JSON over HTTP, on TCP or on a Unix socket:
+`POST /<task>` with `{"texts": [...]}` answers `{"results": [...]}`,
+`GET /health` lists the tasks and `GET /metrics` renders the metrics in
+the Prometheus text format.
+"""
+import argparse
+import http.client
+import importlib
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger("farasapy_logger")
+
+
+class ServerError(Exception):
+    """An error answered by the server, with its HTTP status."""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """
+    Merge the texts of concurrent requests to a task into `do_task_many` calls.
+
+    A batch is sent once `window` seconds passed since its first request or
+    once it holds `max_batch` texts. Requests arriving while a batch runs
+    wait for the next one. If a batch fails, its requests are run one by one
+    and only those that fail again get the error.
+    """
+
+    def __init__(self, task, window=0.005, max_batch=256):
+        self.task = task
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f"farasa-batcher-{task.task}", daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        """Return a future of the results of `texts`, a list of strings."""
+        future = Future()
+        self.requests.put((texts, future))
+        return future
+
+    def _count(self, name, value=1):
+        if self.task.metrics is not None:
+            self.task.metrics.inc(name, self.task.metric_labels, value)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch, size = [request], len(request[0])
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                try:
+                    request = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run_batch(batch, size)
+
+    def _run_batch(self, batch, size):
+        self._count("server_batches_total")
+        self._count("server_requests_total", len(batch))
+        self._count("server_texts_total", size)
+        try:
+            results = self.task.do_task_many([text for texts, _ in batch for text in texts])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # one request may have failed the merged call, each is retried on its own
+            # so that the error only reaches the requests that cause it
+            logger.debug(f"a batch of {len(batch)} requests failed ({e}), running them one by one..")
+            self._count("server_batch_splits_total")
+            for texts, future in batch:
+                try:
+                    future.set_result(self.task.do_task_many(texts))
+                except Exception as request_error:
+                    future.set_exception(request_error)
+            return
+        start = 0
+        for texts, future in batch:
+            future.set_result(results[start : start + len(texts)])
+            start += len(texts)
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, payload, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        farasa_server = self.server.farasa_server
+        if self.path == "/health":
+            self._send(200, farasa_server.health())
+        elif self.path == "/metrics":
+            self._send(200, farasa_server.metrics_text().encode("utf-8"), content_type="text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        batcher = self.server.farasa_server.batchers.get(self.path.strip("/"))
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if batcher is None:
+            self._send(404, {"error": f"no task is served at {self.path}"})
+            return
+        try:
+            texts = json.loads(body)["texts"]
+            assert isinstance(texts, list) and all(isinstance(text, str) for text in texts)
+        except Exception:
+            self._send(400, {"error": 'the body should be {"texts": [strings]}'})
+            return
+        try:
+            results = batcher.submit(texts).result() if texts else []
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, {"results": results})
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class FarasaServer:
+    """
+    Serve task objects over HTTP, on `host:port` or on the Unix socket `unix_socket`.
+
+    The task objects are shared by all the clients. They are not terminated
+    by `shutdown()`, whoever created them does it.
+    """
+
+    def __init__(self, *tasks, host="127.0.0.1", port=8000, unix_socket=None, batch_window=0.005, max_batch=256):
+        assert tasks, "a server needs at least one task"
+        self.tasks = tasks
+        self.batchers = {task.task: MicroBatcher(task, batch_window, max_batch) for task in tasks}
+        self.unix_socket = unix_socket
+        if unix_socket is not None:
+            if os.path.exists(unix_socket):
+                # left behind by a server that did not shut down
+                os.unlink(unix_socket)
+            self.httpd = _UnixHTTPServer(str(unix_socket), _Handler)
+        else:
+            self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.farasa_server = self
+        self.thread = None
+
+    @property
+    def url(self):
+        if self.unix_socket is not None:
+            return f"unix:{self.unix_socket}"
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def health(self):
+        report = dict()
+        for name, batcher in self.batchers.items():
+            task = batcher.task
+            report[name] = {
+                "interactive": task.interactive,
+                "workers": task.health_check() if task.interactive else [],
+            }
+        return {"tasks": report}
+
+    def metrics_text(self):
+        registries = list()
+        for task in self.tasks:
+            if task.metrics is not None and all(task.metrics is not registry for registry in registries):
+                registries.append(task.metrics)
+        return "".join(registry.to_prometheus() for registry in registries)
+
+    def serve_forever(self):
+        logger.info(f"serving {', '.join(self.batchers)} at {self.url}")
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Serve from a background thread and return right away."""
+        self.thread = threading.Thread(target=self.serve_forever, name="farasa-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for batcher in self.batchers.values():
+            batcher.stop()
+        if self.unix_socket is not None and os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class FarasaClient:
+    """
+    A client of `FarasaServer`, with the methods of the task classes.
+
+    `url` is `http://host:port` or `unix:/path/to/socket`. Connections are
+    kept alive, one per thread, so a client can be shared between threads.
+    """
+
+    def __init__(self, url="http://127.0.0.1:8000", timeout=60):
+        self.url = url
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connect(self):
+        if self.url.startswith("unix:"):
+            return _UnixHTTPConnection(self.url[len("unix:") :], self.timeout)
+        parsed = urlparse(self.url)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if body is not None else dict()
+        for attempt in range(2):
+            connection = getattr(self.local, "connection", None)
+            if connection is None:
+                connection = self.local.connection = self._connect()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # the server closed a kept alive connection, try once on a new one
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            try:
+                message = json.loads(data)["error"]
+            except Exception:
+                message = data.decode("utf-8", errors="replace")
+            raise ServerError(message, response.status)
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return json.loads(data)
+        return data.decode("utf-8")
+
+    def do_task_many(self, task, texts):
+        return self._request("POST", f"/{task}", {"texts": list(texts)})["results"]
+
+    def do_task(self, task, text):
+        return self.do_task_many(task, [text])[0]
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def metrics(self):
+        return self._request("GET", "/metrics")
+
+    def segment(self, text):
+        return self.do_task("segment", text)
+
+    def segment_many(self, texts):
+        return self.do_task_many("segment", texts)
+
+    def stem(self, text):
+        return self.do_task("stem", text)
+
+    def stem_many(self, texts):
+        return self.do_task_many("stem", texts)
+
+    def tag(self, text):
+        return self.do_task("POS", text)
+
+    def tag_many(self, texts):
+        return self.do_task_many("POS", texts)
+
+    def recognize(self, text):
+        return self.do_task("NER", text)
+
+    def recognize_many(self, texts):
+        return self.do_task_many("NER", texts)
+
+    def diacritize(self, text):
+        return self.do_task("diacritize", text)
+
+    def diacritize_many(self, texts):
+        return self.do_task_many("diacritize", texts)
+
+    def lemmatize(self, text):
+        return self.do_task("lemmatize", text)
+
+    def lemmatize_many(self, texts):
+        return self.do_task_many("lemmatize", texts)
+
+    def spell_check(self, text):
+        return self.do_task("spell_check", text)
+
+    def spell_check_many(self, texts):
+        return self.do_task_many("spell_check", texts)
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+def main(argv=None):
+    from .cli import TASKS
+
+    parser = argparse.ArgumentParser(description="serve warm Farasa tasks to local clients")
+    parser.add_argument("--task", dest="tasks", action="append", choices=sorted(TASKS), required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=1, help="JVMs per task")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0, help="how long a batch waits for more requests")
+    parser.add_argument("--max-batch", type=int, default=256, help="texts per batch")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    tasks = list()
+    for name in args.tasks:
+        module, class_name, interactive = TASKS[name]
+        task_class = getattr(importlib.import_module(module), class_name)
+        tasks.append(
+            task_class(
+                interactive=interactive,
+                workers=args.workers,
+                cache=not args.no_cache,
+                cache_dir=args.cache_dir,
+                logging_level=args.log_level,
+            )
+        )
+    server = FarasaServer(
+        *tasks,
+        host=args.host,
+        port=args.port,
+        unix_socket=args.unix_socket,
+        batch_window=args.batch_window_ms / 1000,
+        max_batch=args.max_batch,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        for task in tasks:
+            task.terminate()
+
+
+if __name__ == "__main__":
+    main()
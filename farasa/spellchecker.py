@@ -18,3 +18,21 @@ class FarasaSpellChecker(FarasaBase):
 
     def spell_check(self, text):
         return self.do_task(text=text)
+
+    def spell_check_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_spell_check(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def spell_check_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def aspell_check(self, text):
+        return await self.ado_task(text=text)
+
+    async def aspell_check_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_spell_check(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
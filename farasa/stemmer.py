@@ -3,6 +3,7 @@ from .__base import FarasaBase
 
 class FarasaStemmer(FarasaBase):
     task = "stem"
+    word_level = True
 
     @property
     def command(self):
@@ -16,3 +17,21 @@ class FarasaStemmer(FarasaBase):
 
     def stem(self, text):
         return self.do_task(text=text)
+
+    def stem_many(self, texts):
+        return self.do_task_many(texts=texts)
+
+    def iter_stem(self, lines, batch_size=1000):
+        return self.iter_task(lines=lines, batch_size=batch_size)
+
+    def stem_file(self, input_path, output_path, batch_size=1000):
+        return self.do_task_file(input_path, output_path, batch_size=batch_size)
+
+    async def astem(self, text):
+        return await self.ado_task(text=text)
+
+    async def astem_many(self, texts):
+        return await self.ado_task_many(texts=texts)
+
+    def aiter_stem(self, texts, batch_size=256):
+        return self.aiter_task(texts=texts, batch_size=batch_size)
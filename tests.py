@@ -12,6 +12,7 @@ from farasa.segmenter import FarasaSegmenter
 from farasa.stemmer import FarasaStemmer
 from farasa.spellchecker import FarasaSpellChecker
 from farasa.lemmatizer import FarasaLemmatizer
+from farasa.pipeline import FarasaPipeline
 
 # Test samples
 sample = """يُشار إلى أن اللغة العربية يتحدثها أكثر من 422 مليون نسمة ويتوزع متحدثوها في المنطقة المعروفة باسم الوطن العربي بالإضافة إلى العديد من المناطق الأخرى المجاورة مثل الأهواز وتركيا وتشاد والسنغال وإريتريا وغيرها. وهي اللغة الرابعة من لغات منظمة الأمم المتحدة الرسمية الست."""
@@ -67,6 +68,8 @@ def test_custom_cache_directory():
         
         # Test that cache directory is created
         result = stemmer.stem(simple_test)
+        # cache entries are written in the background
+        stemmer.flush_cache()
         
         # Verify cache directory structure
         assert custom_cache.exists(), "Custom cache directory not created!"
@@ -90,6 +93,7 @@ def test_json_cache_format():
         
         stemmer = FarasaStemmer(cache=True, cache_dir=str(cache_dir), logging_level="DEBUG")
         result = stemmer.stem(simple_test)
+        stemmer.flush_cache()
         
         # Find the cache file
         cache_files = list((cache_dir / "stem").glob("*.json"))
@@ -119,6 +123,7 @@ def test_cache_clear():
         stemmer = FarasaStemmer(cache=True, cache_dir=str(cache_dir), logging_level="DEBUG")
         result1 = stemmer.stem(simple_test)
         result2 = stemmer.stem("نص آخر")
+        stemmer.flush_cache()
         
         # Verify cache exists
         task_cache_dir = cache_dir / "stem"
@@ -159,6 +164,580 @@ def test_cross_platform_cache_paths():
     print(f"   ✓ Default cache path correct: {stemmer.cache_dir}")
 
 
+def test_memory_cache():
+    """Test the in-memory LRU tier and the coalescing of identical calls"""
+    print("\n=== Testing Memory Cache ===")
+    from concurrent.futures import ThreadPoolExecutor
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stemmer = FarasaStemmer(cache=True, cache_dir=temp_dir, memory_cache_entries=2)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(stemmer.stem, [simple_test] * 4))
+        assert len(set(results)) == 1, "Coalesced calls returned different results!"
+        stats = stemmer.cache_stats
+        assert stats["disk_misses"] + stats["memory_hits"] + stats["coalesced"] >= 4, stats
+
+        assert stemmer.stem(simple_test) == results[0], "Memory hit returned another result!"
+        assert stemmer.cache_stats["memory_hits"] > stats["memory_hits"], "Memory cache not used!"
+        stemmer.stem("نص آخر")
+        stemmer.stem("نص ثالث")
+        assert stemmer.cache_stats["memory_evictions"] >= 1, "Memory cache not bounded!"
+        assert stemmer.cache_stats["memory_entries"] == 2, "Memory cache not bounded!"
+        print(f"   ✓ Memory cache stats: {stemmer.cache_stats}")
+
+
+def test_line_cache_granularity():
+    """Test that an edited document only recomputes its changed lines"""
+    print("\n=== Testing Line-Level Caching ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lines = [simple_test, "نص آخر", sample]
+        segmenter = FarasaSegmenter(cache=True, cache_dir=temp_dir, cache_granularity="line")
+        result = segmenter.segment("\n".join(lines))
+        assert result == FarasaSegmenter(cache=False).segment("\n".join(lines)), "Line results differ!"
+        misses = segmenter.cache_stats["disk_misses"]
+
+        edited = "\n".join(lines[:2] + ["سطر جديد"])
+        segmenter.segment(edited)
+        assert segmenter.cache_stats["disk_misses"] == misses + 1, "Unchanged lines were recomputed!"
+        print(f"   ✓ Only the edited line was recomputed: {segmenter.cache_stats}")
+
+
+def test_sqlite_cache_backend():
+    """Test the single-file SQLite cache backend"""
+    print("\n=== Testing SQLite Cache Backend ===")
+    from farasa.cache import SQLiteCacheBackend
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stemmer = FarasaStemmer(cache=True, cache_dir=temp_dir, cache_backend="sqlite")
+        result1 = stemmer.stem(simple_test)
+        result2 = stemmer.stem(simple_test)
+        assert result1 == result2, "Cache results don't match!"
+        assert (Path(temp_dir) / "stem.sqlite3").exists(), "SQLite cache file not created!"
+        assert not (Path(temp_dir) / "stem").exists(), "JSON cache directory created!"
+        stemmer.clear_cache()
+        assert len(stemmer.cache_backend) == 0, "Cache not properly cleared!"
+
+        backend = SQLiteCacheBackend(Path(temp_dir) / "capped.sqlite3", max_entries=2, batch_size=1)
+        for i in range(5):
+            backend.set(f"{i:064x}", str(i), str(i))
+        assert len(backend) == 2, "Size cap not enforced!"
+        assert backend.get(f"{4:064x}") == "4", "Most recent entry evicted!"
+        assert backend.get(f"{0:064x}") is None, "Oldest entry not evicted!"
+        backend.close()
+        print("   ✓ SQLite backend caches, clears and evicts correctly")
+
+
+def test_write_behind_cache():
+    """Test that cache writes are queued, seen before they land and written atomically"""
+    print("\n=== Testing Write-Behind Cache ===")
+    import subprocess
+    import sys
+
+    from farasa.cache import JSONCacheBackend, WriteBehindCache
+
+    class SlowBackend(JSONCacheBackend):
+        def set_many(self, items):
+            time.sleep(0.2)
+            super().set_many(items)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = WriteBehindCache(SlowBackend(temp_dir))
+        entries = [(f"{i:064x}", f"text {i}", f"result {i}") for i in range(100)]
+        started = time.perf_counter()
+        cache.set_many(entries)
+        assert time.perf_counter() - started < 0.1, "set_many waited for the disk!"
+        assert cache.get(entries[5][0]) == "result 5", "a queued entry is not seen"
+        cache.flush()
+        assert len(list(Path(temp_dir).glob("*.json"))) == len(entries)
+        assert not list(Path(temp_dir).glob(".*")), "staging files were left behind"
+        cache.close()
+
+        # dropped caches are collected, what they queued is written first
+        import gc
+        import threading
+        import weakref
+
+        from farasa.cache import SQLiteCacheBackend
+
+        dropped = Path(temp_dir) / "dropped"
+        cache = WriteBehindCache(JSONCacheBackend(dropped))
+        cache.set("a" * 64, "text", "result")
+        sqlite_backend = SQLiteCacheBackend(dropped / "entries.sqlite3")
+        sqlite_backend.set("b" * 64, "text", "result")
+        references = [weakref.ref(cache), weakref.ref(sqlite_backend)]
+        del cache, sqlite_backend
+        gc.collect()
+        assert all(reference() is None for reference in references), "A dropped backend was kept alive!"
+        assert not any(thread.name == "farasa-cache-writer" for thread in threading.enumerate())
+        assert JSONCacheBackend(dropped).get("a" * 64) == "result", "A dropped cache lost its entries!"
+        assert SQLiteCacheBackend(dropped / "entries.sqlite3").get("b" * 64) == "result"
+
+        # and a process that exits without flushing writes them too
+        exiting = (
+            "import sys\n"
+            "from farasa.cache import JSONCacheBackend, WriteBehindCache\n"
+            "cache = WriteBehindCache(JSONCacheBackend(sys.argv[1]))\n"
+            "cache.set_many((f'{i:064x}', 'text', 'result') for i in range(100))\n"
+        )
+        subprocess.run([sys.executable, "-c", exiting, str(Path(temp_dir) / "exiting")], check=True)
+        assert len(list((Path(temp_dir) / "exiting").glob("*.json"))) == 100, "Queued entries lost at exit!"
+
+        # processes rewriting the same files while this one reads them
+        writer = (
+            "import sys\n"
+            "from farasa.cache import JSONCacheBackend\n"
+            "backend = JSONCacheBackend(sys.argv[1])\n"
+            "for _ in range(30):\n"
+            "    for i in range(50):\n"
+            "        backend.set(f'{i:064x}', f'text {i}', f'result {i} ' * 2000)\n"
+        )
+        shared_dir = str(Path(temp_dir) / "shared")
+        backend = JSONCacheBackend(shared_dir)
+        writers = [subprocess.Popen([sys.executable, "-c", writer, shared_dir]) for _ in range(3)]
+        reads = 0
+        while any(process.poll() is None for process in writers):
+            for i in range(50):
+                if not backend.path(f"{i:064x}").exists():
+                    continue
+                result = backend.get(f"{i:064x}")
+                assert result == f"result {i} " * 2000, "read a partially written cache file"
+                reads += 1
+        assert all(process.returncode == 0 for process in writers)
+    print(f"   ✓ queued writes are seen, {reads} reads of files being rewritten by 3 processes")
+
+
+def test_results_bundle():
+    """Test exporting a cache into a bundle and looking results up in it"""
+    print("\n=== Testing Results Bundle ===")
+    from farasa.bench import fake_task_class
+    from farasa.bundle import BundleError, ResultsBundle
+    from farasa.metrics import Metrics
+
+    segmenter_class = fake_task_class(FarasaSegmenter)
+    texts = [f"{simple_test} {i}" for i in range(20)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for cache_backend in ("json", "sqlite"):
+            segmenter = segmenter_class(cache_dir=Path(temp_dir) / cache_backend, cache_backend=cache_backend)
+            expected = segmenter.segment_many(texts)
+            bundle_path = segmenter.export_bundle(Path(temp_dir) / f"{cache_backend}.bundle")
+            with ResultsBundle(bundle_path) as bundle:
+                assert len(bundle) == len(texts), len(bundle)
+                assert bundle.metadata == {"task": "segment", "mode": "standalone"}, bundle.metadata
+
+        metrics = Metrics()
+        bundled = segmenter_class(cache=False, bundle=bundle_path, metrics=metrics)
+        assert bundled.segment_many(texts) == expected
+        assert [bundled.segment(text) for text in texts[:3]] == expected[:3]
+        assert metrics.counter("jvm_spawns_total", task="segment", mode="standalone") == 0
+        assert bundled.cache_stats["bundle_hits"] == len(texts) + 3
+        # texts missing from the bundle go to the jar
+        bundled.segment("نص آخر")
+        assert metrics.counter("jvm_spawns_total", task="segment", mode="standalone") == 1
+        assert metrics.counter("cache_misses_total", task="segment", mode="standalone", tier="bundle") == 1
+
+        broken_path = Path(temp_dir) / "broken.bundle"
+        broken_path.write_bytes(b"not a bundle, just some bytes")
+        try:
+            ResultsBundle(broken_path)
+            raise AssertionError("a broken bundle should not open")
+        except BundleError:
+            pass
+    print(f"   ✓ {len(texts)} results exported and served from the bundle")
+
+
+def test_binaries_download():
+    """Test the resumable, verified download against a local HTTP server"""
+    print("\n=== Testing Binaries Download ===")
+    import hashlib
+    import io
+    import threading
+    import zipfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from farasa.download import DownloadError, download_binaries, download_file
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("farasa_bin/lib/FarasaSegmenterJar.jar", b"segmenter" * 1000)
+        f.writestr("farasa_bin/FarasaPOSJar.jar", b"pos" * 1000)
+    payload = archive.getvalue()
+    sha256 = hashlib.sha256(payload).hexdigest()
+    ranges = list()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            start = 0
+            if self.headers.get("Range"):
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+                ranges.append(start)
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.end_headers()
+                return
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Length", str(len(payload) - start))
+            self.end_headers()
+            self.wfile.write(payload[start:])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/farasa_bin.zip"
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            destination = Path(temp_dir) / "farasa_bin.zip"
+            Path(f"{destination}.part").write_bytes(payload[:1000])
+            download_file(url, destination, sha256, progress=False)
+            assert ranges == [1000], "Partial download not resumed!"
+            assert destination.read_bytes() == payload, "Resumed download is corrupted!"
+            print("   ✓ Partial downloads are resumed with a range request")
+
+            destination.unlink()
+            try:
+                download_file(url, destination, "0" * 64, progress=False)
+                raise AssertionError("Checksum mismatch not detected!")
+            except DownloadError:
+                pass
+            assert not destination.exists(), "Corrupted download kept!"
+            assert not Path(f"{destination}.part").exists(), "Corrupted partial download kept!"
+            print("   ✓ Checksum mismatches are rejected")
+
+            target_dir = Path(temp_dir) / "target"
+            (target_dir / "farasa_bin").mkdir(parents=True)
+            (target_dir / "farasa_bin" / "stale.jar").write_bytes(b"stale")
+            download_binaries(target_dir, url=url, expected_sha256=sha256)
+            assert (target_dir / "farasa_bin" / "lib" / "FarasaSegmenterJar.jar").is_file()
+            assert not (target_dir / "farasa_bin" / "stale.jar").exists(), "Old binaries not replaced!"
+            assert not (target_dir / "farasa_bin.zip").exists(), "Downloaded archive not removed!"
+            print("   ✓ Binaries are downloaded and replaced atomically")
+
+            # the default URL is checked against a pinned digest without being asked to
+            from farasa import download
+
+            pinned = download.BINARIES_URL, download.BINARIES_SHA256
+            download.BINARIES_URL, download.BINARIES_SHA256 = url, "0" * 64
+            (Path(temp_dir) / "pinned").mkdir()
+            try:
+                download_binaries(Path(temp_dir) / "pinned", url=url)
+                raise AssertionError("The pinned digest was not checked!")
+            except DownloadError:
+                pass
+            finally:
+                download.BINARIES_URL, download.BINARIES_SHA256 = pinned
+            print("   ✓ The default archive is checked against a pinned digest")
+
+            mirror = Path(temp_dir) / "mirror.zip"
+            mirror.write_bytes(payload)
+            download_binaries(target_dir, url=mirror.as_uri(), expected_sha256=sha256)
+            assert mirror.exists(), "Local mirror archive removed!"
+            assert (target_dir / "farasa_bin" / "FarasaPOSJar.jar").is_file()
+            print("   ✓ Local mirrors are used without the network")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pos_parser():
+    """Test the parser of the POS tagger output"""
+    print("\n=== Testing POS Parser ===")
+    from farasa.pos import iter_tagged_tokens
+
+    tagged_text = "S/S يشار/V-MS ال+ لغ +ة/DET+NOUN+NSUFF-FS 19/5/1955/NUM E/E"
+    tokens = [token.as_tuple() for token in iter_tagged_tokens(tagged_text)]
+    assert tokens == [
+        ("يشار", (["V", ("M", "S")],)),
+        ("ال", (["DET"],)),
+        ("لغ", (["NOUN"],)),
+        ("ة", (["NSUFF", ("F", "S")],)),
+        ("19/5/1955", (["NUM"],)),
+    ], tokens
+    combined = [token.as_tuple() for token in iter_tagged_tokens(tagged_text, combine_subtokens=True)]
+    assert combined[1] == ("اللغة", (["DET"], ["NOUN"], ["NSUFF", ("F", "S")])), combined
+    assert len(combined) == 3, "Subtokens not combined!"
+    assert list(iter_tagged_tokens("")) == [], "An empty text did not parse to no tokens!"
+    print(f"   ✓ Tagged tokens parsed: {combined}")
+
+
+def test_columnar_results():
+    """Test the columnar batches of POS and NER results"""
+    print("\n=== Testing Columnar Results ===")
+    from farasa.columnar import TagVocabulary, TaggedBatch
+    from farasa.ner import iter_recognized_pairs
+    from farasa.pos import iter_tagged_pairs
+
+    vocabulary = TagVocabulary()
+    tagged_texts = [
+        "S/S يشار/V-MS ال+ لغ +ة/DET+NOUN+NSUFF-FS E/E",
+        "S/S 19/5/1955/NUM E/E",
+        "S/S E/E",
+        "",
+    ]
+    batch = TaggedBatch.from_sentences((iter_tagged_pairs(text) for text in tagged_texts), vocabulary)
+    assert len(batch) == 5 and batch.num_sentences == 4, (len(batch), batch.num_sentences)
+    assert batch.sentence(0) == [("يشار", "V-MS"), ("ال", "DET"), ("لغ", "NOUN"), ("ة", "NSUFF-FS")]
+    assert batch.sentence(2) == [] and batch.sentence(3) == [], "Empty sentences not kept!"
+    assert batch[-1] == ("19/5/1955", "NUM"), batch[-1]
+
+    tail = batch.sentences(1, 4)
+    assert tail.data is batch.data, "Slicing copied the tokens!"
+    assert list(tail.iter_sentences()) == [[("19/5/1955", "NUM")], [], []]
+    assert list(batch.tokens_between(1, 3)) == [("ال", "DET"), ("لغ", "NOUN")]
+
+    entities = TaggedBatch.from_sentences([iter_recognized_pairs("الأمم/B-ORG المتحدة/I-ORG هي/O")], vocabulary)
+    assert entities.sentence(0)[1] == ("المتحدة", "I-ORG"), entities.sentence(0)
+    assert vocabulary[batch.tag_ids[-1]] == "NUM", "Tag ids not shared!"
+    print(f"   ✓ {len(batch)} tokens in {batch.nbytes} bytes, {len(vocabulary)} tags")
+
+
+def test_desegmenter():
+    """Test that the bulk desegmenter matches the word by word rules on random texts"""
+    print("\n=== Testing Desegmenter ===")
+    import random
+
+    from farasa.segmenter import desegment_text, iter_desegment
+
+    rng = random.Random(0)
+    pieces = ["ل", "ا", "ال", "+", "ال+", "ل+", "ب", "ة", " ", "\n"]
+    for separator in (" ", "+", "ل", "  "):
+        for _ in range(5000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+            expected = " ".join(FarasaSegmenter._desegment_word(word) for word in text.split(separator))
+            assert desegment_text(text, separator) == expected, (separator, text)
+
+    lines = [f"و+ال+كتاب ل+ال+طالب {i}\n" for i in range(100)]
+    assert list(iter_desegment(lines, jobs=2, batch_size=30)) == [desegment_text(line) for line in lines]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path, output_path = Path(temp_dir) / "in.txt", Path(temp_dir) / "out.txt"
+        input_path.write_text("".join(lines), encoding="utf-8")
+        FarasaSegmenter(cache=False).desegment_file(input_path, output_path)
+        assert output_path.read_text(encoding="utf-8").splitlines()[0] == "والكتاب للطالب 0"
+    print("   ✓ Bulk desegmentation matches the word by word rules")
+
+
+def test_batch_processing():
+    """Test that batch results match the results of single calls"""
+    print("\n=== Testing Batch Processing ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        texts = [simple_test, sample, "", "نص آخر\nوسطر ثان", simple_test]
+        segmenter = FarasaSegmenter(cache=True, cache_dir=temp_dir)
+        # warm the cache with one text so the batch mixes hits and misses
+        first = segmenter.segment(texts[0])
+        results = segmenter.segment_many(texts)
+        assert len(results) == len(texts), "Batch lost some results!"
+        assert results[0] == first and results[-1] == first, "Cached result not reused!"
+
+        no_cache_segmenter = FarasaSegmenter(cache=False)
+        expected = [no_cache_segmenter.segment(text) for text in texts]
+        assert results == expected, "Batch results differ from single calls!"
+        print(f"   ✓ {len(texts)} texts processed in one batch")
+
+
+def test_file_streaming():
+    """Test file to file processing and the line iterator in both modes"""
+    print("\n=== Testing File Streaming ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lines = [simple_test, "نص آخر", sample]
+        input_path = Path(temp_dir) / "input.txt"
+        input_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        for interactive in (False, True):
+            segmenter = FarasaSegmenter(interactive=interactive, cache=False)
+            try:
+                expected = [segmenter.segment(line) for line in lines]
+                assert list(segmenter.iter_segment(lines, batch_size=2)) == expected, "Iterator results differ!"
+                output_path = Path(temp_dir) / f"output_{interactive}.txt"
+                segmenter.segment_file(input_path, output_path)
+                output_lines = output_path.read_text(encoding="utf-8").strip().split("\n")
+                assert output_lines == expected, "File results differ!"
+            finally:
+                if interactive:
+                    segmenter.terminate()
+        print("   ✓ Files and iterators processed in both modes")
+
+
+def test_parallel_standalone_chunks():
+    """Test that chunked standalone runs are stitched back in order"""
+    print("\n=== Testing Parallel Standalone Chunks ===")
+
+    long_text = "\n".join([sample] * 20)
+    segmenter = FarasaSegmenter(cache=False, standalone_jobs=4, min_chunk_chars=1000)
+    chunks, _ = segmenter._split_chunks(long_text)
+    assert len(chunks) == 4, "Text not split into chunks!"
+    expected = FarasaSegmenter(cache=False).segment(long_text)
+    assert segmenter.segment(long_text) == expected, "Chunked result differs!"
+    print(f"   ✓ {len(long_text)} characters processed in {len(chunks)} chunks")
+
+
+def test_type_level_processing():
+    """Test that repeated words are processed once in type level mode"""
+    print("\n=== Testing Type-Level Processing ===")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        text = " ".join([simple_test] * 5 + ["نص", "آخر", simple_test])
+        stemmer = FarasaStemmer(cache=True, cache_dir=temp_dir, type_level=True)
+        result = stemmer.stem(text)
+        assert result == FarasaStemmer(cache=False).stem(text), "Type level results differ!"
+        assert len(stemmer.type_vocabulary) == 3, "Every distinct word should be processed once!"
+
+        vocabulary_path = Path(temp_dir) / "vocabulary.json"
+        stemmer.save_vocabulary(vocabulary_path)
+        other_stemmer = FarasaStemmer(cache=False, type_level=True)
+        other_stemmer.load_vocabulary(vocabulary_path)
+        assert other_stemmer.type_vocabulary.entries == stemmer.type_vocabulary.entries, "Vocabulary not restored!"
+
+        # a word with an empty result keeps its place
+        other_stemmer.type_vocabulary.set("نص", "")
+        words = other_stemmer.stem(f"{simple_test} نص آخر").split(" ")
+        assert len(words) == 3 and words[1] == "", words
+
+        # the vocabulary is bounded, words evicted within a batch are still joined
+        bounded_stemmer = FarasaStemmer(cache=False, type_level=True, type_vocabulary_entries=2)
+        assert bounded_stemmer.stem(text) == result, "A bounded vocabulary changed the results!"
+        assert len(bounded_stemmer.type_vocabulary) == 2, "The vocabulary is not bounded!"
+        print(f"   ✓ {len(text.split())} words processed as {len(stemmer.type_vocabulary)} types")
+
+
+def test_class_data_sharing():
+    """Test the JVM options and the class-data-sharing archive of the launches"""
+    print("\n=== Testing Class Data Sharing ===")
+    import stat
+    import sys
+
+    from farasa import __base as base
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        # a java that logs its options, dumps an archive when asked and copies its input
+        java = temp_dir / "bin" / "java"
+        java.parent.mkdir()
+        java.write_text(
+            f"""#!{sys.executable}
+import json, shutil, sys
+args = sys.argv[1:]
+if args == ["-version"]:
+    sys.stderr.write('openjdk version "17.0.2"\\n')
+    sys.exit(0)
+with open({str(temp_dir / "launches.txt")!r}, "a") as log:
+    log.write(json.dumps(args) + "\\n")
+for arg in args:
+    if arg.startswith("-XX:ArchiveClassesAtExit="):
+        open(arg.split("=", 1)[1], "wb").write(b"archive")
+shutil.copy(args[args.index("-i") + 1], args[args.index("-o") + 1])
+""",
+            encoding="utf-8",
+        )
+        java.chmod(java.stat().st_mode | stat.S_IEXEC)
+        jar = temp_dir / "Segmenter.jar"
+        jar.write_bytes(b"jar")
+        path = os.environ["PATH"]
+        os.environ["PATH"] = f"{java.parent}{os.pathsep}{path}"
+        try:
+            for _ in range(2):
+                segmenter = FarasaSegmenter(
+                    binary_path=jar,
+                    cache=False,
+                    cache_dir=temp_dir,
+                    jvm_options=["-Xmx1g"],
+                    class_data_sharing=True,
+                )
+                assert segmenter.segment(simple_test) == simple_test
+            # a new process finds the archive on disk
+            base._cds_archives.clear()
+            segmenter.segment(simple_test)
+        finally:
+            os.environ["PATH"] = path
+        launches = [json.loads(line) for line in (temp_dir / "launches.txt").read_text().splitlines()]
+        assert len(launches) == 4, launches
+        training, runs = launches[0], launches[1:]
+        assert any(arg.startswith("-XX:ArchiveClassesAtExit=") for arg in training), training
+        archives = list((temp_dir / "cds").glob("Segmenter-*.jsa"))
+        assert len(archives) == 1, archives
+        for run in runs:
+            jar_position = run.index("-jar")
+            assert run[jar_position - 2 : jar_position] == ["-Xmx1g", f"-XX:SharedArchiveFile={archives[0]}"], run
+    print(f"   ✓ one training run, then {len(runs)} launches with {archives[0].name}")
+
+
+def test_command_line():
+    """Test the farasapy command on directories, resumed runs and stdin"""
+    print("\n=== Testing Command Line ===")
+    import subprocess
+    import sys
+
+    from farasa import cli
+
+    lines = [f"{simple_test} {i}" for i in range(50)]
+    segmenter = FarasaSegmenter(cache=False)
+    expected = "".join(segmenter.segment(line) + "\n" for line in lines)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir, output_dir = Path(temp_dir) / "corpus", Path(temp_dir) / "out"
+        (input_dir / "nested").mkdir(parents=True)
+        for name in ("a.txt", "b.txt", "nested/c.txt"):
+            (input_dir / name).write_text("\n".join(lines) + "\n", encoding="utf-8")
+        arguments = ["segment", "-i", str(input_dir), "-o", str(output_dir), "--cache-dir", temp_dir, "-q"]
+        assert cli.main(arguments + ["--jobs", "2"]) == 0
+        for name in ("a.txt", "b.txt", "nested/c.txt"):
+            assert (output_dir / name).read_text(encoding="utf-8") == expected, name
+
+        # an interrupted run left 10 lines and a half in a.txt.part
+        (output_dir / "a.txt").unlink()
+        marked = expected.splitlines(keepends=True)
+        partial = "".join(marked[:10]).replace(marked[0], "kept\n") + marked[10][:3]
+        (output_dir / "a.txt.part").write_text(partial, encoding="utf-8")
+        assert cli.main(arguments) == 0
+        resumed = (output_dir / "a.txt").read_text(encoding="utf-8")
+        assert resumed == "kept\n" + "".join(marked[1:]), resumed[:100]
+        assert not (output_dir / "a.txt.part").exists()
+
+        proc = subprocess.run(
+            [sys.executable, "-m", "farasa.cli", "segment", "--no-cache", "-q"],
+            input="\n".join(lines).encode("utf-8"),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        assert proc.stdout.decode("utf-8") == expected
+
+        # --jobs bounds the JVMs: standalone files in parallel run one JVM per batch each
+        args = cli.build_parser().parse_args(["segment", "--standalone", "--jobs", "4", "--no-cache"])
+        assert cli.create_task(args, parallel_files=True).standalone_jobs == 1
+        assert cli.create_task(args).standalone_jobs == 4
+    print(f"   ✓ 3 files in parallel, a resumed file and stdin of {len(lines)} lines")
+
+
+def test_import_time():
+    """Test that importing farasa leaves the task modules and download-only dependencies out"""
+    print("\n=== Testing Import Time ===")
+    import subprocess
+    import sys
+
+    def imported(statement):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        modules = dict()
+        for line in proc.stderr.decode("utf-8").splitlines():
+            if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+                _, cumulative, name = line.split("|")
+                modules[name.strip()] = int(cumulative)
+        return modules
+
+    # what the interpreter loads by itself, site packages hooks included
+    startup = set(imported("pass"))
+    package = imported("import farasa")
+    assert not any(name.startswith("farasa.") for name in package), sorted(package)
+    segmenter = imported("import farasa.segmenter")
+    for module in ("requests", "tqdm", "asyncio", "sqlite3", "zipfile", "urllib.request", "multiprocessing"):
+        assert module in startup or module not in segmenter, f"import farasa.segmenter loads {module}"
+    print(f"   ✓ import farasa: {package['farasa']}us, import farasa.segmenter: {segmenter['farasa.segmenter']}us")
+
+
 def run_basic_functionality_tests():
     """Run tests for all basic Farasa functionality"""
     print("\n=== Testing Basic Functionality (Non-Interactive) ===")
@@ -241,6 +820,375 @@ def run_interactive_mode_tests():
     # print("sample lemmatized:", lemmatized)
 
 
+def run_lazy_start_tests():
+    """Test lazy interactive objects and the shared environment checks"""
+    print("\n=== Testing Lazy Start ===")
+    from farasa import __base as base
+
+    FarasaSegmenter(cache=False)
+    assert base._environment_probes, "Environment checks not remembered!"
+
+    segmenter = FarasaSegmenter(interactive=True, lazy=True, cache=False)
+    try:
+        assert segmenter.task_proc is None, "Lazy object started its JVM!"
+        assert segmenter.segment(simple_test), "Lazy segmentation failed!"
+        assert segmenter.task_proc is not None, "JVM not started on first use!"
+    finally:
+        segmenter.terminate()
+
+    segmenter = FarasaSegmenter(interactive=True, lazy=True, cache=False)
+    try:
+        segmenter.warm(background=True).join()
+        assert segmenter.task_proc is not None, "JVM not started by warm()!"
+    finally:
+        segmenter.terminate()
+    print("   ✓ Lazy objects start on first use or on warm()")
+
+
+def run_interactive_workers_tests():
+    """Test sharing an interactive object with several workers between threads"""
+    print("\n=== Testing Interactive Workers ===")
+    from concurrent.futures import ThreadPoolExecutor
+
+    lines = [simple_test, "نص آخر", sample]
+    segmenter = FarasaSegmenter(interactive=True, workers=2, cache=False)
+    try:
+        expected = [segmenter.segment(line) for line in lines]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(segmenter.segment, lines * 4))
+        assert results == expected * 4, "Workers returned mismatched outputs!"
+        multiline = segmenter.segment("\n".join(lines))
+        assert multiline == "\n".join(expected), "Line order was not preserved!"
+        print(f"   ✓ {len(results)} concurrent calls served by {segmenter.workers} workers")
+    finally:
+        segmenter.terminate()
+
+    # more lines than the in-flight window, the reader must hand them back in order
+    from farasa.bench import fake_task_class
+
+    document = [f"{simple_test} {i}" for i in range(200)]
+    pipelined = fake_task_class(FarasaSegmenter, per_line=0.0001)(interactive=True, inflight_window=4, cache=False)
+    try:
+        standalone = fake_task_class(FarasaSegmenter)(cache=False)
+        expected = standalone.segment("\n".join(document))
+        assert pipelined.segment("\n".join(document)) == expected, "The pipelined lines came back out of order!"
+        assert pipelined.segment_many(document) == expected.split("\n"), "The pipelined texts came back out of order!"
+    finally:
+        pipelined.terminate()
+    print(f"   ✓ {len(document)} lines kept in order through an in-flight window of 4")
+
+
+def run_asyncio_tests():
+    """Test the awaitable API in both modes"""
+    print("\n=== Testing Asyncio API ===")
+    import asyncio
+
+    texts = [simple_test, "نص آخر", sample]
+
+    async def check(segmenter):
+        expected = [segmenter.segment(text) for text in texts]
+        results = await asyncio.gather(*(segmenter.asegment(text) for text in texts))
+        assert list(results) == expected, "Async results differ from sync ones!"
+        assert await segmenter.asegment_many(texts) == expected, "Async batch results differ!"
+        streamed = [result async for result in segmenter.aiter_segment(texts, batch_size=2)]
+        assert streamed == expected, "Async iteration results differ!"
+        await segmenter.aterminate()
+
+    asyncio.run(check(FarasaSegmenter(cache=False)))
+    print("   ✓ Standalone asyncio API works")
+    interactive_segmenter = FarasaSegmenter(interactive=True, cache=False)
+    try:
+        asyncio.run(check(interactive_segmenter))
+    finally:
+        interactive_segmenter.terminate()
+    print("   ✓ Interactive asyncio API works")
+
+    # every asyncio.run has its own loop, the workers of the previous one must not outlive it
+    from concurrent.futures import ThreadPoolExecutor
+
+    segmenter = FarasaSegmenter(interactive=True, cache=False, workers=2)
+    try:
+        asyncio.run(segmenter.asegment_many(texts))
+        pids = [worker.proc.pid for worker in segmenter.async_workers]
+        asyncio.run(segmenter.asegment_many(texts))
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                continue
+            raise AssertionError(f"the worker {pid} of a closed loop is still running")
+
+        # loops in several threads coalesce their own calls only
+        def run_loop(_):
+            async def segment_twice():
+                return await asyncio.gather(segmenter.asegment(sample), segmenter.asegment(sample))
+            return asyncio.run(segment_twice())
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            outputs = [result for results in executor.map(run_loop, range(8)) for result in results]
+        assert len(set(outputs)) == 1 and not segmenter._ainflight, "Loops mixed their in-flight calls!"
+    finally:
+        segmenter.terminate()
+    print("   ✓ Workers of closed loops are killed, loops in threads coalesce separately")
+
+
+def run_pipeline_tests():
+    """Test a pipeline of interactive tasks against separate calls"""
+    print("\n=== Testing Pipeline ===")
+
+    texts = [simple_test, "نص آخر", sample]
+    pipeline = FarasaPipeline(
+        FarasaSegmenter(interactive=True, cache=False),
+        FarasaPOSTagger(interactive=True, cache=False),
+        FarasaNamedEntityRecognizer(interactive=True, cache=False),
+    )
+    try:
+        results = pipeline.process_many(texts)
+        assert len(results) == len(texts), "Pipeline lost some documents!"
+        for text, result in zip(texts, results):
+            for task in pipeline.tasks:
+                assert result[task.task] == task.do_task(text), f"{task.task} result differs!"
+        print(f"   ✓ {len(texts)} documents through {len(pipeline.tasks)} stages")
+    finally:
+        pipeline.terminate()
+
+
+def run_offline_bench_tests():
+    """Test every task class against the fake jar, with no java needed"""
+    print("\n=== Testing Tasks On The Fake Jar ===")
+    from farasa.bench import bench_tasks, fake_task_class
+
+    texts = [simple_test, "اللغة العربية", "", sample]
+    for task_class in (
+        FarasaSegmenter,
+        FarasaStemmer,
+        FarasaPOSTagger,
+        FarasaNamedEntityRecognizer,
+        FarasaDiacritizer,
+        FarasaLemmatizer,
+    ):
+        fake_class = fake_task_class(task_class)
+        standalone = fake_class(cache=False)
+        interactive = fake_class(interactive=True, cache=False)
+        try:
+            expected = [standalone.do_task(text) for text in texts]
+            assert interactive.do_task_many(texts) == expected, f"{task_class.__name__} modes differ!"
+            assert standalone.do_task_many(texts) == expected, f"{task_class.__name__} batch differs!"
+        finally:
+            interactive.terminate()
+    tagger = fake_task_class(FarasaPOSTagger)(cache=False)
+    tokens = tagger.tag_segments("اللغة العربية")
+    assert [token.as_tuple()[0] for token in tokens] == ["ال", "لغة", "ال", "عربية"], tokens
+    assert tagger.tag_segments("") == [], "An empty text did not tag to no tokens!"
+    batch = tagger.tag_columnar(["", "اللغة العربية", ""])
+    assert batch.num_sentences == 3 and len(batch) == 4, (batch.num_sentences, len(batch))
+
+    report = bench_tasks(
+        task_classes=(FarasaSegmenter,), calls=1, lines=20, cache_lookups=5, document_chars=(1000,)
+    )
+    timings = report["FarasaSegmenter"]
+    assert timings["memory_hit_us"] < timings["standalone_ms"] * 1e3, "Cache hits slower than the jar!"
+    assert timings["disk_hit_us"] < timings["standalone_ms"] * 1e3, "Disk hits ran the jar!"
+    print(f"   ✓ Every task matches across modes, segmenter timings: {timings}")
+
+
+def run_metrics_tests():
+    """Test the counters, histograms and hooks of the metrics registry"""
+    print("\n=== Testing Metrics ===")
+    import contextlib
+
+    from farasa.bench import fake_task_class
+    from farasa.metrics import Metrics
+
+    metrics = Metrics()
+    finished, traced = list(), list()
+    metrics.add_callback(lambda name, labels, seconds, error: finished.append(name))
+
+    @contextlib.contextmanager
+    def tracer(name, labels):
+        traced.append((name, labels["task"]))
+        yield
+
+    metrics.add_span_hook(tracer)
+    segmenter_class = fake_task_class(FarasaSegmenter)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        standalone = segmenter_class(cache_dir=temp_dir, metrics=metrics)
+        standalone.segment(simple_test)
+        standalone.segment(simple_test)
+        interactive = segmenter_class(interactive=True, cache=False, metrics=metrics, logging_level="CRITICAL")
+        try:
+            interactive.segment(simple_test)
+            # a dead process is restarted by the next call
+            interactive.task_proc.kill()
+            interactive.task_proc.wait()
+            interactive.segment("اللغة العربية")
+        finally:
+            interactive.terminate()
+
+        assert metrics.counter("jvm_spawns_total", task="segment", mode="standalone") == 1
+        assert metrics.counter("jvm_spawns_total", task="segment", mode="interactive") == 2
+        assert metrics.counter("pipe_restarts_total", task="segment", mode="interactive") == 1
+        assert metrics.counter("cache_hits_total", task="segment", mode="standalone", tier="memory") == 1
+        assert metrics.counter("bytes_read_total", task="segment", mode="interactive") > 0
+        # the second standalone call is a memory hit, counted but not timed
+        assert finished == ["run_task_standalone", "do_task"] + ["run_task_interactive", "do_task"] * 2, finished
+        assert ("do_task", "segment") in traced, traced
+
+        text = metrics.to_prometheus()
+        assert '# TYPE farasapy_do_task_seconds histogram' in text, text
+        assert 'farasapy_do_task_seconds_count{mode="standalone",task="segment"} 1' in text, text
+        assert 'le="+Inf"' in text, text
+
+        # the memory hits of a collected object stay in the totals, and its collector goes
+        import gc
+
+        collectors = len(metrics.collectors)
+        del standalone
+        gc.collect()
+        assert len(metrics.collectors) == collectors - 1, "The collector of a collected object was kept!"
+        assert metrics.counter("cache_hits_total", task="segment", mode="standalone", tier="memory") == 1
+    print(f"   ✓ {len(text.splitlines())} Prometheus lines, spans: {finished}")
+
+
+def run_watchdog_tests():
+    """Test timeouts, stderr draining and recycling of the interactive workers"""
+    print("\n=== Testing Worker Watchdog ===")
+    import time
+
+    from farasa.bench import fake_task_class
+    from farasa.metrics import Metrics
+
+    metrics = Metrics()
+    # the fake jar answers the startup probe and two lines, then hangs
+    hanging_class = fake_task_class(FarasaSegmenter, extra_args=["--hang-after", "3"])
+    segmenter = hanging_class(interactive=True, cache=False, timeout=1, metrics=metrics, logging_level="CRITICAL")
+    try:
+        segmenter.segment(simple_test)
+        segmenter.segment(simple_test)
+        started = time.monotonic()
+        try:
+            segmenter.segment(simple_test)
+            raise AssertionError("a hung process should time out")
+        except TimeoutError:
+            pass
+        assert time.monotonic() - started < 5
+        # the stuck process was killed, the next call gets a new one
+        assert not segmenter.health_check()[0]["alive"]
+        assert segmenter.segment(simple_test)
+        assert metrics.counter("timeouts_total", task="segment", mode="interactive") == 1
+    finally:
+        segmenter.terminate()
+
+    # 100KB of stderr per line fills the pipe within a line if nobody reads it
+    chatty_class = fake_task_class(FarasaSegmenter, extra_args=["--stderr-per-line", "100000"])
+    segmenter = chatty_class(interactive=True, cache=False, timeout=30, logging_level="CRITICAL")
+    try:
+        assert len(segmenter.segment("\n".join([simple_test] * 20)).split("\n")) == 20
+    finally:
+        segmenter.terminate()
+
+    segmenter = fake_task_class(FarasaSegmenter)(
+        interactive=True, cache=False, max_worker_requests=10, metrics=metrics, logging_level="CRITICAL"
+    )
+    try:
+        first_pid = segmenter.task_proc.pid
+        lines = [f"{simple_test} {i}" for i in range(35)]
+        outputs = segmenter.segment("\n".join(lines)).split("\n")
+        assert len(outputs) == 35 and outputs[-1].endswith("34"), outputs[-1]
+        assert segmenter.task_proc.pid != first_pid
+        # the probe line and 35 lines, 10 lines per process
+        assert metrics.counter("worker_recycles_total", task="segment", mode="interactive") == 3
+    finally:
+        segmenter.terminate()
+    assert segmenter.task_proc.poll() is not None
+    assert not segmenter.task_workers[0].reader.is_alive()
+
+    # a full window queues a line behind 63 others for ~130ms, only the 2ms per line count
+    steady_class = fake_task_class(FarasaSegmenter, per_line=0.002)
+    lines = "\n".join(f"{simple_test} {i}" for i in range(600))
+    for max_worker_latency, recycled in ((0.05, False), (0.001, True)):
+        metrics = Metrics()
+        segmenter = steady_class(
+            interactive=True,
+            cache=False,
+            max_worker_latency=max_worker_latency,
+            metrics=metrics,
+            logging_level="CRITICAL",
+        )
+        try:
+            assert len(segmenter.segment(lines).split("\n")) == 600
+        finally:
+            segmenter.terminate()
+        recycles = metrics.counter("worker_recycles_total", task="segment", mode="interactive")
+        assert bool(recycles) == recycled, (max_worker_latency, recycles)
+    print("   ✓ hung processes time out, stderr is drained and workers are recycled")
+
+
+def run_server_tests():
+    """Test the micro-batching server and its client over TCP and a Unix socket"""
+    print("\n=== Testing Server ===")
+    from concurrent.futures import ThreadPoolExecutor
+
+    from farasa.bench import fake_task_class
+    from farasa.metrics import Metrics
+    from farasa.server import FarasaClient, FarasaServer, ServerError
+
+    metrics = Metrics()
+    segmenter = fake_task_class(FarasaSegmenter)(interactive=True, cache=False, metrics=metrics, logging_level="CRITICAL")
+    tagger = fake_task_class(FarasaPOSTagger)(interactive=True, cache=False, metrics=metrics, logging_level="CRITICAL")
+    texts = [f"{simple_test} {i}" for i in range(100)]
+    expected = [segmenter.segment(text) for text in texts]
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for address in (dict(port=0), dict(unix_socket=os.path.join(temp_dir, "farasa.sock"))):
+                with FarasaServer(segmenter, tagger, batch_window=0.01, **address) as server:
+                    client = FarasaClient(server.url)
+                    with ThreadPoolExecutor(max_workers=16) as executor:
+                        assert list(executor.map(client.segment, texts)) == expected, server.url
+                    assert client.segment_many(texts[:5]) == expected[:5]
+                    assert client.tag(simple_test) == tagger.tag(simple_test)
+                    assert client.health()["tasks"]["segment"]["workers"][0]["alive"]
+                    assert "farasapy_server_batches_total" in client.metrics()
+                    try:
+                        client.stem(simple_test)
+                        raise AssertionError("a task the server does not run should fail")
+                    except ServerError as e:
+                        assert e.status == 404, e.status
+                    client.close()
+    finally:
+        segmenter.terminate()
+        tagger.terminate()
+    batches = metrics.counter("server_batches_total", task="segment", mode="interactive")
+    requests = metrics.counter("server_requests_total", task="segment", mode="interactive")
+    assert requests == 2 * (len(texts) + 1) and batches < requests, (batches, requests)
+
+    # a text that fails the merged call only fails the request it came with
+    from farasa.server import MicroBatcher
+
+    class FailingSegmenter(fake_task_class(FarasaSegmenter)):
+        def do_task_many(self, texts, *args, **kwargs):
+            if "boom" in texts:
+                raise TimeoutError("boom timed out")
+            return super().do_task_many(texts, *args, **kwargs)
+
+    failing_metrics = Metrics()
+    segmenter = FailingSegmenter(interactive=True, cache=False, metrics=failing_metrics, logging_level="CRITICAL")
+    batcher = MicroBatcher(segmenter, window=0.5)
+    try:
+        good, bad = batcher.submit(texts[:3]), batcher.submit(["boom"])
+        assert good.result() == expected[:3]
+        try:
+            bad.result()
+            raise AssertionError("the failing request should fail")
+        except TimeoutError:
+            pass
+    finally:
+        batcher.stop()
+        segmenter.terminate()
+    assert failing_metrics.counter("server_batch_splits_total", task="segment", mode="interactive") == 1
+    print(f"   ✓ {requests} concurrent requests served in {batches} batches, failures stay with their request")
+
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -254,10 +1202,34 @@ def main():
         test_json_cache_format()
         test_cache_clear()
         test_cross_platform_cache_paths()
+        test_memory_cache()
+        test_line_cache_granularity()
+        test_sqlite_cache_backend()
+        test_write_behind_cache()
+        test_results_bundle()
+        test_binaries_download()
+        test_pos_parser()
+        test_columnar_results()
+        test_desegmenter()
+        test_batch_processing()
+        test_parallel_standalone_chunks()
+        test_type_level_processing()
+        test_class_data_sharing()
+        test_command_line()
+        test_import_time()
+        test_file_streaming()
         
         # Test basic functionality
         run_basic_functionality_tests()
         run_interactive_mode_tests()
+        run_lazy_start_tests()
+        run_interactive_workers_tests()
+        run_asyncio_tests()
+        run_pipeline_tests()
+        run_offline_bench_tests()
+        run_metrics_tests()
+        run_watchdog_tests()
+        run_server_tests()
         
         print("\n" + "=" * 60)
         print("✅ ALL TESTS PASSED!")